@@ -0,0 +1,177 @@
+"""Bulk import and export of LeetGo users, cohorts, goals and reminders
+
+Example:
+    python admin.py export users users.csv
+    python admin.py import cohorts cohorts.jsonl
+    python admin.py import users users.csv
+
+Files are CSV with a header row or JSONL with one object per line; the format
+follows the file extension unless ``--format`` is given. Both directions stream,
+so memory stays constant however many rows there are, and an import runs as a
+single transaction: either every row is written or none is. Rows are matched on
+the cohort ID or the Discord user ID and updated in place, so re-importing a
+file is safe. Import cohorts before the users that belong to them, and users
+before their goals and reminders: those only update registered users, and
+their rows for anyone else are skipped.
+
+Stop the bot while importing; it caches profiles and cohort names in memory and
+would not see the imported rows until it restarts.
+"""
+from dotenv import load_dotenv
+from itertools import chain
+from os import getenv
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from database import BULK_ENTITIES, Database
+
+logger = logging.getLogger('LeetGo')
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path: str, requested: str = None) -> str:
+    """Returns the requested format, or the one implied by the file extension"""
+    if requested:
+        return requested
+    if path and path.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_records(stream, file_format: str):
+    """Yields (line number, dict) pairs from a CSV or JSONL stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {line_number}: invalid JSON: {e}") from e
+
+
+def convert(value, column_type):
+    """Converts a CSV or JSON value to the column type, treating empty values as NULL"""
+    if value is None or value == '':
+        return None
+    return column_type(value)
+
+
+def parse_rows(entity: str, records) -> tuple:
+    """Checks the records of an entity and returns (columns, generator of row tuples)
+
+    The columns are those of the first record. Later records are read with the
+    same columns, which CSV guarantees and the JSONL export produces.
+
+    Raises:
+        ValueError: The file is empty, lacks the key column or has unknown columns;
+            the generator raises it for a row with a bad value
+    """
+    _, key, types, _ = BULK_ENTITIES[entity]
+    first = next(records, None)
+    if first is None:
+        raise ValueError(f"No {entity} to import")
+    columns = list(first[1])
+    unknown = [column for column in columns if column not in types]
+    if unknown:
+        raise ValueError(f"Unknown {entity} columns: {', '.join(unknown)} (expected {', '.join(types)})")
+    if key not in columns:
+        raise ValueError(f"The {entity} file needs a {key} column")
+    key_index = columns.index(key)
+
+    def rows():
+        for line_number, record in chain([first], records):
+            try:
+                row = tuple(convert(record.get(column), types[column]) for column in columns)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Line {line_number}: {e}") from e
+            if row[key_index] is None:
+                raise ValueError(f"Line {line_number}: missing {key}")
+            yield row
+
+    return columns, rows()
+
+
+def export_entity(db: Database, entity: str, stream, file_format: str) -> int:
+    """Writes every row of an entity to the stream and returns how many were written"""
+    columns = list(BULK_ENTITIES[entity][2])
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        for row in db.export_rows(entity):
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+    else:
+        for row in db.export_rows(entity):
+            stream.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def import_entity(db: Database, entity: str, stream, file_format: str) -> tuple:
+    """Upserts every row of the stream in one transaction and returns (rows created, rows updated, rows skipped)"""
+    columns, rows = parse_rows(entity, read_records(stream, file_format))
+    with db.batch():
+        return db.import_rows(entity, columns, rows)
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=getenv('DB_PATH', 'storage.db'), help='database path (default: DB_PATH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write an entity to a file, or stdout')
+    export_parser.add_argument('entity', choices=list(BULK_ENTITIES))
+    export_parser.add_argument('path', nargs='?', help='output file (default: stdout)')
+    export_parser.add_argument('--format', choices=FORMATS, help='file format (default: from the extension, else csv)')
+    import_parser = commands.add_parser('import', help='insert or update an entity from a file, or stdin')
+    import_parser.add_argument('entity', choices=list(BULK_ENTITIES))
+    import_parser.add_argument('path', nargs='?', help='input file (default: stdin)')
+    import_parser.add_argument('--format', choices=FORMATS, help='file format (default: from the extension, else csv)')
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+    file_format = detect_format(args.path, args.format)
+    db = Database(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == 'export':
+            stream = open(args.path, 'w', newline='', encoding='utf-8') if args.path else sys.stdout
+            try:
+                count = export_entity(db, args.entity, stream, file_format)
+            finally:
+                if args.path:
+                    stream.close()
+            action = 'Exported'
+        else:
+            stream = open(args.path, newline='', encoding='utf-8') if args.path else sys.stdin
+            try:
+                created, updated, skipped = import_entity(db, args.entity, stream, file_format)
+            finally:
+                if args.path:
+                    stream.close()
+            count = created + updated
+            action = 'Imported'
+    except Exception as e:
+        logger.error(f"Error running {args.command} of {args.entity}: {e}")
+        return 1
+    finally:
+        db.kill()
+    summary = f" ({created} created, {updated} updated, {skipped} skipped)" if args.command == 'import' else ''
+    print(f"{action} {count} {args.entity}{summary} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,307 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+import asyncio
+import functools
+import logging
+import threading
+import time
+from database import Database
+import metrics
+
+logger = logging.getLogger('LeetGo')
+
+# Database methods that only read and may run concurrently on the reader pool
+READ_METHODS = frozenset({
+    'find_user',
+    'get_all_cohorts',
+    'get_unassigned_cohorts',
+    'get_user_cohort',
+    'get_cohort_name',
+    'get_user_roadmap',
+    'get_user_goal',
+    'get_user_reminder',
+    'get_users_with_reminder_time',
+    'get_all_reminders',
+    'get_due_reminders',
+    'get_legacy_usernames',
+    'get_user_profile',
+    'get_lc_usernames_page',
+    'get_cohort_leaderboard',
+    'get_latest_solved',
+    'get_goal_baseline',
+    'get_active_goals',
+    'get_bot_state',
+    'get_last_good_stats',
+})
+
+# How each setter keyed by discord_id changes that user's cached profile,
+# given the setter's remaining arguments. Setters mapped to None drop the cached
+# profile so the next read reloads it; setters missing here (or any failed
+# write) conservatively drop every cached profile.
+PROFILE_WRITES = {
+    'upsert_user': lambda discord_username, lc_username: {'discord_username': discord_username,
+                                                          'lc_username': lc_username},
+    'update_user_cohort': None,
+    'remove_user_from_cohort': lambda: {'cohort_id': None, 'cohort_name': None},
+    'set_user_roadmap': lambda roadmap: {'roadmap': roadmap},
+    'set_user_goal': lambda questions, months, start_date, baseline_solved=None: {
+        'goal_questions': questions, 'goal_duration': months, 'goal_start_date': start_date,
+        'goal_baseline_solved': baseline_solved},
+    'set_user_reminder': lambda hour, minute, home_guild_id=None: {'reminder_hour': hour, 'reminder_minute': minute},
+    'remove_user_reminder': lambda: {'reminder_hour': None, 'reminder_minute': None},
+}
+
+# Writes that never touch a column of a user profile
+NON_PROFILE_WRITES = frozenset({
+    'add_stats_snapshots',
+    'assign_cohort_guild',
+    'set_bot_state',
+    'save_last_good_stats',
+})
+
+
+class AsyncDatabase:
+    """Awaitable facade over Database that keeps sqlite I/O off the event loop
+
+    Every write runs on one dedicated writer thread that owns the primary
+    connection, so writes stay serialized exactly as before. Reads run on a
+    small pool of threads, each with its own connection, so concurrent commands
+    can overlap their lookups. Any public Database method is available as a
+    coroutine with the same name and arguments.
+
+    With group commit enabled (``DB_GROUP_COMMIT_MS`` > 0), writes arriving
+    within the window are coalesced into one transaction and a single fsync.
+    ``DB_DURABILITY=full`` (default) resolves each write only once its batch is
+    committed; ``relaxed`` resolves as soon as the statement has executed, at
+    the cost of losing up to one window of writes on a crash.
+
+    User profiles returned by ``get_user_profile`` are cached in memory and
+    kept current by the setters (write-through), so most commands resolve the
+    caller without touching sqlite at all. Writes made by other processes are
+    not seen, so when several processes share the database ``profile_ttl``
+    bounds how long a cached profile is trusted.
+    """
+
+    def __init__(self, path: str = None, read_pool_size: int = None,
+                 group_commit_ms: float = None, durability: str = None, max_batch_size: int = None,
+                 profile_cache_size: int = None, profile_ttl: float = 0):
+        """Opens the writer connection and prepares the reader pool
+
+        Args:
+            path: Location of the sqlite database file, ``DB_PATH`` or storage.db by default
+            read_pool_size: Number of reader threads/connections
+            group_commit_ms: Window in milliseconds used to coalesce writes, 0 disables batching
+            durability: 'full' to acknowledge writes after commit, 'relaxed' after execution
+            max_batch_size: Number of queued writes that forces an early commit
+            profile_cache_size: Number of user profiles kept in memory
+            profile_ttl: Seconds a cached profile is served before it is reloaded, 0 for no expiry
+        """
+        self.path = path or getenv('DB_PATH', 'storage.db')
+        self.read_pool_size = read_pool_size or int(getenv('DB_READ_POOL_SIZE', '4'))
+        if group_commit_ms is None:
+            group_commit_ms = float(getenv('DB_GROUP_COMMIT_MS', '0'))
+        self.group_commit_window = group_commit_ms / 1000
+        self.durability = durability or getenv('DB_DURABILITY', 'full')
+        if self.durability not in ('full', 'relaxed'):
+            raise ValueError(f"Unknown DB_DURABILITY {self.durability!r}, expected 'full' or 'relaxed'")
+        self.max_batch_size = max_batch_size or int(getenv('DB_GROUP_COMMIT_MAX', '500'))
+        self._pending = []
+        self._flush_handle = None
+        self.profile_cache_size = profile_cache_size or int(getenv('DB_PROFILE_CACHE_SIZE', '10000'))
+        self.profile_ttl = profile_ttl
+        # Discord ID -> (profile, monotonic time it was loaded)
+        self._profiles = OrderedDict()
+        # Bumped on every write so a read that raced with one is not cached
+        self._generation = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='leetgo-db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=self.read_pool_size,
+                                           thread_name_prefix='leetgo-db-reader')
+        self._local = threading.local()
+        self._reader_dbs = []
+        self._reader_lock = threading.Lock()
+        # Creating the writer first guarantees the schema exists before any reader opens
+        self._db = self._writer.submit(Database, self.path).result()
+
+    def _reader_db(self) -> Database:
+        """Returns the connection owned by the current reader thread"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = Database(self.path, migrate=False)
+            self._local.db = db
+            with self._reader_lock:
+                self._reader_dbs.append(db)
+        return db
+
+    def _call_read(self, name: str, args: tuple, kwargs: dict):
+        return getattr(self._reader_db(), name)(*args, **kwargs)
+
+    def _call_write(self, name: str, args: tuple, kwargs: dict):
+        return getattr(self._db, name)(*args, **kwargs)
+
+    async def _run(self, executor, fn, *args):
+        """Runs a blocking call on the given executor without blocking the loop"""
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def _queue_write(self, name: str, args: tuple, kwargs: dict):
+        """Queues a write for the next group commit and waits for its outcome"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((name, args, kwargs, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_pending()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.group_commit_window, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        """Hands the queued writes to the writer thread as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return None
+        batch, self._pending = self._pending, []
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._writer, self._write_batch, batch, loop)
+
+    def _write_batch(self, batch: list, loop):
+        """Executes queued writes inside one transaction on the writer thread
+
+        Each write runs in its own savepoint, so one that fails partway leaves
+        none of its statements behind while the rest of the batch still commits.
+        """
+        outcomes = []
+        try:
+            with self._db.batch():
+                for name, args, kwargs, future in batch:
+                    try:
+                        with self._db.savepoint():
+                            outcome = (True, getattr(self._db, name)(*args, **kwargs))
+                    except Exception as e:
+                        outcome = (False, e)
+                    if self.durability == 'relaxed':
+                        self._resolve(loop, future, outcome)
+                    else:
+                        outcomes.append((future, outcome))
+        except Exception as e:
+            logger.error(f"Error committing batch of {len(batch)} writes: {e}")
+            outcomes = [(future, (False, e)) for _, _, _, future in batch]
+        for future, outcome in outcomes:
+            self._resolve(loop, future, outcome)
+
+    @staticmethod
+    def _resolve(loop, future, outcome: tuple):
+        """Completes a write's future from the writer thread"""
+        if loop is None or loop.is_closed():
+            return
+
+        def complete():
+            if future.done():
+                return
+            ok, value = outcome
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+        loop.call_soon_threadsafe(complete)
+
+    async def flush(self):
+        """Commits every queued write now; called on shutdown"""
+        pending = self._flush_pending()
+        if pending is not None:
+            await pending
+
+    async def get_user_profile(self, discord_id: int) -> dict:
+        """Returns the cached profile of a user, loading it with one query on a miss"""
+        cached = self._profiles.get(discord_id)
+        if cached is not None and (not self.profile_ttl or time.monotonic() - cached[1] < self.profile_ttl):
+            self._profiles.move_to_end(discord_id)
+            metrics.PROFILE_CACHE.inc('hit')
+            return cached[0]
+
+        metrics.PROFILE_CACHE.inc('miss')
+        generation = self._generation
+        try:
+            with metrics.DB_LATENCY.time('get_user_profile'):
+                profile = await self._run(self._readers, self._call_read, 'get_user_profile', (discord_id,), {})
+        except Exception:
+            metrics.DB_ERRORS.inc('get_user_profile')
+            raise
+        if generation == self._generation:
+            self._cache_profile(discord_id, profile)
+        return profile
+
+    def _cache_profile(self, discord_id: int, profile):
+        self._profiles[discord_id] = (profile, time.monotonic())
+        self._profiles.move_to_end(discord_id)
+        while len(self._profiles) > self.profile_cache_size:
+            self._profiles.popitem(last=False)
+
+    def _write_through(self, name: str, args: tuple, kwargs: dict, succeeded: bool):
+        """Applies a setter to the cached profile of the user it changed"""
+        if name in NON_PROFILE_WRITES:
+            return
+        self._generation += 1
+        if not succeeded or name not in PROFILE_WRITES or not args:
+            self._profiles.clear()
+            return
+        discord_id, changes = args[0], PROFILE_WRITES[name]
+        cached = self._profiles.get(discord_id)
+        if changes is None or cached is None or cached[0] is None:
+            self._profiles.pop(discord_id, None)
+            return
+        profile, loaded_at = cached
+        self._profiles[discord_id] = ({**profile, **changes(*args[1:], **kwargs)}, loaded_at)
+
+    def __getattr__(self, name: str):
+        """Exposes Database methods as coroutines routed to the reader or writer thread"""
+        if name.startswith('_') or name in ('kill', 'batch') or not callable(getattr(Database, name, None)):
+            raise AttributeError(name)
+
+        if name in READ_METHODS:
+            executor, fn = self._readers, self._call_read
+        else:
+            executor, fn = self._writer, self._call_write
+
+        @functools.wraps(getattr(Database, name))
+        async def call(*args, **kwargs):
+            with metrics.DB_LATENCY.time(name):
+                if executor is self._readers:
+                    try:
+                        return await self._run(executor, fn, name, args, kwargs)
+                    except Exception:
+                        metrics.DB_ERRORS.inc(name)
+                        raise
+                try:
+                    if self.group_commit_window > 0:
+                        result = await self._queue_write(name, args, kwargs)
+                    else:
+                        result = await self._run(executor, fn, name, args, kwargs)
+                except BaseException:
+                    metrics.DB_ERRORS.inc(name)
+                    self._write_through(name, args, kwargs, succeeded=False)
+                    raise
+                self._write_through(name, args, kwargs, succeeded=True)
+                return result
+
+        return call
+
+    def kill(self):
+        """Waits for queued queries to finish, then closes every connection
+
+        Writes still waiting for a group commit are executed and committed
+        before the writer connection is closed.
+        """
+        try:
+            if self._pending:
+                batch, self._pending = self._pending, []
+                self._writer.submit(self._write_batch, batch, None).result()
+            self._readers.shutdown(wait=True)
+            self._writer.shutdown(wait=True)
+            for db in self._reader_dbs:
+                db.kill()
+            self._db.kill()
+        except Exception as e:
+            logger.error(f"Error shutting down database threads: {e}")
@@ -0,0 +1 @@
+"""Offline benchmarks for LeetGo; run with ``python -m benchmarks.run --help``"""
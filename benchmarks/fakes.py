@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+
+# Snowflake-sized IDs so the fakes look like real Discord objects
+_ids = itertools.count(900_000_000_000_000_000)
+
+
+class FakeUser:
+    """Stand-in for discord.User / discord.Member that records the DMs it receives"""
+
+    def __init__(self, user_id: int, name: str, dm_latency: float = 0.0):
+        self.id = user_id
+        self.name = name
+        self.mention = f'<@{user_id}>'
+        self.dm_channel = None
+        self.dm_latency = dm_latency
+        self.received = 0
+
+    def __str__(self) -> str:
+        return self.name
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.dm_latency)
+        self.dm_channel = self.dm_channel or object()
+        self.received += 1
+
+
+class FakeChannel:
+    """Stand-in for discord.TextChannel"""
+
+    def __init__(self, name: str, category=None):
+        self.id = next(_ids)
+        self.name = name
+        self.category = category
+
+    async def send(self, content=None, **kwargs):
+        return None
+
+    async def delete(self, reason: str = None):
+        if self.category is not None and self in self.category.channels:
+            self.category.channels.remove(self)
+
+
+class FakeCategory:
+    """Stand-in for discord.CategoryChannel"""
+
+    def __init__(self, name: str):
+        self.id = next(_ids)
+        self.name = name
+        self.channels = []
+
+
+class FakeGuild:
+    """Stand-in for discord.Guild with a "Cohorts" category"""
+
+    def __init__(self, guild_id: int, name: str, cohort_channels: list = ()):
+        self.id = guild_id
+        self.name = name
+        cohorts = FakeCategory('Cohorts')
+        cohorts.channels = [FakeChannel(channel_name, cohorts) for channel_name in cohort_channels]
+        self.categories = [cohorts]
+        self.members = []
+
+    async def create_text_channel(self, name: str, category=None, **kwargs) -> FakeChannel:
+        channel = FakeChannel(name, category)
+        if category is not None:
+            category.channels.append(channel)
+        return channel
+
+
+class FakeResponse:
+    """Stand-in for discord.InteractionResponse that keeps the last reply"""
+
+    def __init__(self):
+        self._done = False
+        self.content = None
+        self.kwargs = {}
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _reply(self, content=None, **kwargs):
+        if self._done:
+            raise RuntimeError('This interaction has already been responded to')
+        self._done = True
+        self.content = content
+        self.kwargs = kwargs
+
+    async def send_message(self, content=None, **kwargs):
+        await self._reply(content, **kwargs)
+
+    async def edit_message(self, content=None, **kwargs):
+        await self._reply(content, **kwargs)
+
+    async def defer(self, **kwargs):
+        await self._reply(None, **kwargs)
+
+
+class FakeFollowup:
+    """Stand-in for the followup webhook of an interaction"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        self.messages.append((content, kwargs))
+
+
+class FakeInteraction:
+    """Stand-in for discord.Interaction, enough to drive the slash command callbacks"""
+
+    def __init__(self, user: FakeUser, guild: FakeGuild = None):
+        self.id = next(_ids)
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild is not None else None
+        self.extras = {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+class FakeResolver:
+    """Drop-in for RecipientResolver that hands out FakeUsers instead of calling Discord"""
+
+    def __init__(self, dm_latency: float = 0.0):
+        self.dm_latency = dm_latency
+        self._users = {}
+
+    async def resolve(self, discord_id: int) -> FakeUser:
+        user = self._users.get(discord_id)
+        if user is None:
+            user = self._users[discord_id] = FakeUser(discord_id, f'recipient{discord_id}', self.dm_latency)
+        return user
+
+    @property
+    def delivered(self) -> int:
+        return sum(user.received for user in self._users.values())
@@ -0,0 +1,102 @@
+import random
+import time
+from database import Database
+
+# Offsets that turn a synthetic user or guild number into a Discord ID
+USER_ID_BASE = 100_000_000_000_000_000
+GUILD_ID_BASE = 200_000_000_000_000_000
+
+ROADMAPS = ['Beginner', 'Intermediate', 'Advanced', 'Interview Prep']
+WEEK = 7 * 24 * 3600
+
+
+def discord_name(index: int) -> str:
+    return f'bench_user{index}'
+
+
+def lc_name(index: int) -> str:
+    return f'lc_user{index}'
+
+
+def guild_id(index: int) -> int:
+    return GUILD_ID_BASE + index
+
+
+def cohort_name(index: int) -> str:
+    return f'cohort-{index}'
+
+
+def populate(path: str, users: int, guilds: int = 10, cohorts: int = 200, cohort_fraction: float = 0.5,
+             reminder_fraction: float = 0.2, reminder_slots: int = 60, goal_fraction: float = 0.3,
+             snapshots_per_user: int = 4, seed: int = 42) -> dict:
+    """Fills a fresh database with a synthetic population
+
+    Users ``i`` are called bench_user{i} / lc_user{i} and belong to guild
+    ``i % guilds``; cohort ``c`` belongs to guild ``c % guilds`` and members only
+    join cohorts of their own guild. Reminders are spread over the first
+    ``reminder_slots`` minutes after 08:00, and snapshots go through
+    Database.add_stats_snapshots so the leaderboard aggregates are maintained
+    exactly as in production.
+
+    Returns:
+        A summary of what was written, including the reminder slots used
+    """
+    rng = random.Random(seed)
+    db = Database(path)
+    now = int(time.time())
+    slots = [divmod(8 * 60 + slot, 60) for slot in range(reminder_slots)]
+    cohorts_by_guild = {}
+    try:
+        with db.batch():
+            cohort_rows = []
+            for index in range(cohorts):
+                cohort_rows.append((index + 1, cohort_name(index), guild_id(index % guilds), GUILD_ID_BASE * 2 + index))
+                cohorts_by_guild.setdefault(index % guilds, []).append(index + 1)
+            db.c.executemany('INSERT INTO cohorts (cohort_id, name, guild_id, channel_id) VALUES (?, ?, ?, ?)',
+                             cohort_rows)
+
+            user_rows = []
+            reminders = 0
+            goals = 0
+            for index in range(users):
+                guild_cohorts = cohorts_by_guild.get(index % guilds)
+                cohort_id = rng.choice(guild_cohorts) if guild_cohorts and rng.random() < cohort_fraction else None
+                goal = (rng.choice([50, 100, 250]), rng.choice([1, 3, 6]),
+                        time.strftime('%Y-%m-%d', time.localtime(now - rng.randrange(60) * 86400)),
+                        rng.randrange(300)) if rng.random() < goal_fraction else (None,) * 4
+                reminder = rng.choice(slots) if slots and rng.random() < reminder_fraction else (None, None)
+                reminders += reminder[0] is not None
+                goals += goal[0] is not None
+                user_rows.append((USER_ID_BASE + index, discord_name(index), lc_name(index), cohort_id,
+                                  rng.choice(ROADMAPS), *goal, *reminder))
+            db.c.executemany('''INSERT INTO users
+                             (discord_id, discord_username, lc_username, cohort_id, roadmap,
+                              goal_questions, goal_duration, goal_start_date, goal_baseline_solved,
+                              reminder_hour, reminder_minute)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', user_rows)
+
+        # One ingestion pass per snapshot, oldest first, like the real ingester
+        for pass_number in range(snapshots_per_user):
+            taken_at = now - (snapshots_per_user - 1 - pass_number) * WEEK
+            rows = []
+            for index in range(users):
+                easy, medium, hard = (rng.randrange(100) + pass_number * 5, rng.randrange(200) + pass_number * 3,
+                                      rng.randrange(50) + pass_number)
+                rows.append((USER_ID_BASE + index, taken_at, easy, medium, hard, rng.randrange(1, 5_000_000)))
+                if len(rows) == 10000:
+                    db.add_stats_snapshots(rows)
+                    rows = []
+            if rows:
+                db.add_stats_snapshots(rows)
+    finally:
+        db.kill()
+
+    return {
+        'users': users,
+        'guilds': guilds,
+        'cohorts': cohorts,
+        'reminders': reminders,
+        'goals': goals,
+        'snapshots': users * snapshots_per_user,
+        'reminder_slots': slots,
+    }
@@ -0,0 +1,296 @@
+"""Drives the slash commands, reminder ticks and hot database queries against a synthetic population
+
+Example:
+    python -m benchmarks.run --users 100000 --iterations 2000 --json results.json
+    python -m benchmarks.run --users 100000 --compare results.json
+
+Nothing talks to Discord or LeetCode: commands receive fake interactions,
+reminders go to fake users, and /stats and stats ingestion are served by a
+local stand-in for the REST stats API or LeetCode GraphQL (``--provider``).
+Every benchmark reports throughput and p50/p95/p99 latency. With
+``--compare``, the run fails when a p95 regressed beyond ``--tolerance``.
+"""
+from statistics import quantiles
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+from benchmarks.fakes import FakeGuild, FakeInteraction, FakeResolver, FakeUser
+from benchmarks.population import USER_ID_BASE, cohort_name, discord_name, guild_id, lc_name, populate
+from benchmarks.stats_server import StatsServer
+from database import Database
+import metrics
+
+logger = logging.getLogger('LeetGo')
+
+# Differences below this many milliseconds are treated as noise by --compare
+NOISE_FLOOR_MS = 1.0
+
+
+class ErrorCounter(logging.Handler):
+    """Counts the errors the bot logs, so silently failing commands show up in the report"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """Turns latencies in seconds into a report row in milliseconds"""
+    if len(latencies) > 1:
+        cuts = quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        'calls': len(latencies),
+        'per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': p50 * 1000,
+        'p95_ms': p95 * 1000,
+        'p99_ms': p99 * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'errors': errors,
+    }
+
+
+async def measure(calls: list, concurrency: int, errors: ErrorCounter, run) -> dict:
+    """Awaits ``run(item)`` for every item with ``concurrency`` callers in flight"""
+    latencies = []
+    pending = iter(calls)
+    errors_before = errors.count
+
+    async def worker():
+        for item in pending:
+            started = time.perf_counter()
+            await run(item)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(calls))))))
+    return summarize(latencies, time.perf_counter() - started, errors.count - errors_before)
+
+
+def command_benchmarks(main, guilds: list, slots: list, rng: random.Random) -> dict:
+    """Returns one coroutine factory per command, taking the index of the calling user"""
+
+    def interaction(index: int) -> FakeInteraction:
+        return FakeInteraction(FakeUser(USER_ID_BASE + index, discord_name(index)), guilds[index % len(guilds)])
+
+    return {
+        'set-username': lambda index: main.set_username.callback(interaction(index), lc_name(index)),
+        'roadmap': lambda index: main.roadmap.callback(interaction(index)),
+        'stats': lambda index: main.get_stats.callback(interaction(index)),
+        'set-goal': lambda index: main.set_goal.callback(interaction(index), 100, 3),
+        'set-reminders': lambda index: main.set_reminders.callback(interaction(index), *rng.choice(slots)),
+        'view-reminders': lambda index: main.view_reminders.callback(interaction(index)),
+        'join-a-cohort': lambda index: main.join_a_cohort.callback(interaction(index), None),
+        'join-a-cohort autocomplete': lambda index: main.cohort_name_autocomplete(interaction(index), 'cohort-1'),
+        'cohort-leaderboard': lambda index: main.cohort_leaderboard.callback(interaction(index), None),
+    }
+
+
+async def run_commands(main, args, guilds: list, slots: list, errors: ErrorCounter) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+    for name, make_call in command_benchmarks(main, guilds, slots, rng).items():
+        users = [rng.randrange(args.users) for _ in range(args.iterations)]
+        results[f'command {name}'] = await measure(users, args.concurrency, errors, make_call)
+    return results
+
+
+async def run_reminder_ticks(main, args, slots: list, errors: ErrorCounter) -> dict:
+    """Fires the busiest reminder slots through check_reminders with fake recipients"""
+    resolver = FakeResolver(args.dm_latency_ms / 1000)
+    main.reminder_dispatcher.resolver = resolver
+    await main.refresh_goal_digest()
+    main.reminder_scheduler.load(await main.db.get_all_reminders())
+
+    busiest = sorted(slots, key=lambda slot: -len(main.reminder_scheduler.due(*slot)))[:args.ticks]
+    started = time.perf_counter()
+    tick = await measure(busiest, 1, errors,
+                         lambda slot: main.check_reminders(*slot, main.reminder_scheduler.due(*slot)))
+    elapsed = time.perf_counter() - started
+    tick['delivered'] = resolver.delivered
+    tick['delivered_per_second'] = resolver.delivered / elapsed if elapsed > 0 else 0.0
+    return {'reminder tick': tick}
+
+
+async def run_ingestion(main, server: StatsServer, errors: ErrorCounter) -> dict:
+    """Times one stats ingestion pass over every user and counts the upstream requests it made"""
+    requests_before = server.requests
+    ingestion = await measure([None], 1, errors, lambda _: main.stats_ingester.ingest_once())
+    ingestion['stats_requests'] = server.requests - requests_before
+    return {'ingestion pass': ingestion}
+
+
+def run_queries(args, errors: ErrorCounter) -> dict:
+    """Times the hot Database methods directly, bypassing the async facade and its caches"""
+    rng = random.Random(args.seed)
+    db = Database(args.db, migrate=False)
+    point = [rng.randrange(args.users) for _ in range(args.iterations)]
+    cohorts = [rng.randrange(1, args.cohorts + 1) for _ in range(args.iterations)] if args.cohorts else []
+    scans = range(args.scans)
+    queries = {
+        'db get_user_profile': (point, lambda index: db.get_user_profile(USER_ID_BASE + index)),
+        'db get_latest_solved': (point, lambda index: db.get_latest_solved(USER_ID_BASE + index)),
+        'db get_cohort_leaderboard': (cohorts, lambda cohort_id: db.get_cohort_leaderboard(cohort_id, 'weekly')),
+        'db get_all_reminders': (scans, lambda _: db.get_all_reminders()),
+        'db get_active_goals': (scans, lambda _: db.get_active_goals()),
+        'db get_all_cohorts': (scans, lambda _: db.get_all_cohorts()),
+    }
+    results = {}
+    try:
+        for name, (calls, query) in queries.items():
+            errors_before = errors.count
+            latencies = []
+            started = time.perf_counter()
+            for item in calls:
+                call_started = time.perf_counter()
+                query(item)
+                latencies.append(time.perf_counter() - call_started)
+            results[name] = summarize(latencies, time.perf_counter() - started, errors.count - errors_before)
+    finally:
+        db.kill()
+    return results
+
+
+def print_report(results: dict):
+    header = f"{'benchmark':<34}{'calls':>8}{'ops/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, row in results.items():
+        print(f"{name:<34}{row['calls']:>8}{row['per_second']:>11.1f}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}{row['errors']:>8}")
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """Returns a description of every benchmark whose p95 regressed against the baseline"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, row in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        limit = max(before['p95_ms'] * (1 + tolerance), before['p95_ms'] + NOISE_FLOOR_MS)
+        if row['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {row['p95_ms']:.2f} ms vs {before['p95_ms']:.2f} ms baseline")
+        if row['errors'] > before['errors']:
+            regressions.append(f"{name}: {row['errors']} errors vs {before['errors']} baseline")
+    return regressions
+
+
+def remove_database(path: str):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+async def run(args) -> int:
+    if not (args.reuse and os.path.exists(args.db)):
+        remove_database(args.db)
+        started = time.perf_counter()
+        population = populate(args.db, args.users, guilds=args.guilds, cohorts=args.cohorts,
+                              reminder_slots=args.reminder_slots, snapshots_per_user=args.snapshots,
+                              seed=args.seed)
+        print(f"Seeded {args.db} in {time.perf_counter() - started:.1f}s: "
+              f"{population['users']} users, {population['cohorts']} cohorts in {population['guilds']} guilds, "
+              f"{population['reminders']} reminders, {population['goals']} goals, "
+              f"{population['snapshots']} snapshots")
+    slots = [divmod(8 * 60 + slot, 60) for slot in range(args.reminder_slots)] or [(8, 0)]
+
+    server = StatsServer(args.stats_latency_ms / 1000)
+    os.environ['DB_PATH'] = args.db
+    os.environ['STATS_API_URL'] = await server.start()
+    os.environ['LEETCODE_GRAPHQL_URL'] = f'{server.url}/graphql'
+    os.environ['STATS_PROVIDER'] = args.provider
+    os.environ.setdefault('STATS_INGEST_INTERVAL', '0')
+    # The ingester's jitter is pacing for the real API; here it would only inflate --ingest timings
+    os.environ.setdefault('STATS_INGEST_JITTER', '0')
+
+    errors = ErrorCounter()
+    logger.addHandler(errors)
+    # Imported only now so the bot picks up the benchmark database and stats URL
+    main = importlib.import_module('main')
+    try:
+        guilds = [FakeGuild(guild_id(index), f'guild{index}',
+                            [cohort_name(cohort) for cohort in range(index, args.cohorts, args.guilds)])
+                  for index in range(args.guilds)]
+        main.cohort_directory.load(await main.db.get_all_cohorts())
+
+        results = {}
+        results.update(await run_commands(main, args, guilds, slots, errors))
+        results.update(await run_reminder_ticks(main, args, slots, errors))
+        if args.ingest:
+            results.update(await run_ingestion(main, server, errors))
+        await main.db.flush()
+        results.update(run_queries(args, errors))
+    finally:
+        await main.stats_client.close()
+        await main.db.flush()
+        main.db.kill()
+        await server.stop()
+
+    print_report(results)
+    print(f"Stats API requests: {server.requests}, coalesced lookups: "
+          f"{metrics.SINGLEFLIGHT_CALLS.value('stats', 'coalesced'):.0f}, stats cache: {main.stats_cache.stats()}")
+    tick = results['reminder tick']
+    print(f"Reminder DMs delivered: {tick['delivered']} ({tick['delivered_per_second']:.1f}/s)")
+    if args.ingest:
+        print(f"Ingestion pass ({args.provider} provider): {results['ingestion pass']['stats_requests']} "
+              f"stats API requests for {args.users} users")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'arguments': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+                       'results': results}, f, indent=2)
+        print(f"Wrote results to {args.json}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=os.path.join('benchmarks', 'bench.db'), help='benchmark database path')
+    parser.add_argument('--reuse', action='store_true', help='reuse an existing benchmark database instead of reseeding')
+    parser.add_argument('--users', type=int, default=10000, help='synthetic users to seed')
+    parser.add_argument('--guilds', type=int, default=10, help='guilds the users and cohorts are spread over')
+    parser.add_argument('--cohorts', type=int, default=200, help='cohorts to seed')
+    parser.add_argument('--snapshots', type=int, default=4, help='weekly stats snapshots per user')
+    parser.add_argument('--reminder-slots', type=int, default=60, help='distinct reminder minutes to spread reminders over')
+    parser.add_argument('--iterations', type=int, default=1000, help='calls per command and per point query')
+    parser.add_argument('--scans', type=int, default=5, help='repetitions of full-table queries')
+    parser.add_argument('--concurrency', type=int, default=20, help='commands in flight at once')
+    parser.add_argument('--ticks', type=int, default=5, help='reminder slots to fire, busiest first')
+    parser.add_argument('--provider', choices=('rest', 'graphql'), default='rest', help='stats provider to benchmark')
+    parser.add_argument('--ingest', action='store_true', help='also time one stats ingestion pass over every user')
+    parser.add_argument('--stats-latency-ms', type=float, default=50, help='latency of the stand-in stats API')
+    parser.add_argument('--dm-latency-ms', type=float, default=20, help='latency of each fake reminder DM')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the population and the workload')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline results file; exit 1 when a p95 regressed')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 increase over the baseline')
+    parser.add_argument('--verbose', action='store_true', help='show the bot\'s info logs')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    # Configured before main is imported so the benchmark never writes to leetgo.log
+    logging.basicConfig(level=logging.INFO if arguments.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(run(arguments)))
@@ -0,0 +1,109 @@
+import asyncio
+import re
+import zlib
+from aiohttp import web
+
+# Only usernames with this prefix exist; anything else answers like an unknown LeetCode user
+USERNAME_PREFIX = 'lc_user'
+
+
+def synthetic_stats(username: str) -> dict:
+    """Returns deterministic stats shaped like the real stats API response"""
+    seed = zlib.crc32(username.encode())
+    easy, medium, hard = seed % 400, (seed >> 9) % 700, (seed >> 19) % 200
+    return {
+        'status': 'success',
+        'message': 'retrieved',
+        'totalSolved': easy + medium + hard,
+        'totalQuestions': 3200,
+        'easySolved': easy,
+        'totalEasy': 800,
+        'mediumSolved': medium,
+        'totalMedium': 1650,
+        'hardSolved': hard,
+        'totalHard': 750,
+        'acceptanceRate': 55.2,
+        'ranking': seed % 5_000_000 + 1,
+        'contributionPoints': seed % 1000,
+        'reputation': seed % 50,
+    }
+
+
+# Matches the aliased matchedUser fields of a query built by GraphQLStatsProvider
+ALIAS_PATTERN = re.compile(r'(\w+):\s*matchedUser\(username:\s*\$(\w+)\)')
+
+QUESTION_TOTALS = [
+    {'difficulty': 'All', 'count': 3200},
+    {'difficulty': 'Easy', 'count': 800},
+    {'difficulty': 'Medium', 'count': 1650},
+    {'difficulty': 'Hard', 'count': 750},
+]
+
+
+def synthetic_matched_user(username: str) -> dict:
+    """Returns the synthetic stats of a user shaped like a GraphQL matchedUser result"""
+    stats = synthetic_stats(username)
+    return {
+        'profile': {'ranking': stats['ranking'], 'reputation': stats['reputation']},
+        'contributions': {'points': stats['contributionPoints']},
+        'submitStats': {'acSubmissionNum': [
+            {'difficulty': 'All', 'count': stats['totalSolved']},
+            {'difficulty': 'Easy', 'count': stats['easySolved']},
+            {'difficulty': 'Medium', 'count': stats['mediumSolved']},
+            {'difficulty': 'Hard', 'count': stats['hardSolved']},
+        ]},
+    }
+
+
+class StatsServer:
+    """Local stand-in for the LeetCode stats API with a configurable response latency
+
+    ``GET /<username>`` answers like the REST stats API and ``POST /graphql``
+    answers the aliased queries of GraphQLStatsProvider. ``requests`` counts both.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        username = request.match_info['username']
+        if not username.startswith(USERNAME_PREFIX):
+            return web.json_response({'status': 'error', 'message': 'user does not exist'})
+        return web.json_response(synthetic_stats(username))
+
+    async def _handle_graphql(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        payload = await request.json()
+        variables = payload.get('variables') or {}
+        data = {'allQuestionsCount': QUESTION_TOTALS}
+        errors = []
+        for alias, variable in ALIAS_PATTERN.findall(payload['query']):
+            username = variables[variable]
+            if username.startswith(USERNAME_PREFIX):
+                data[alias] = synthetic_matched_user(username)
+            else:
+                data[alias] = None
+                errors.append({'message': 'That user does not exist.', 'path': [alias]})
+        return web.json_response({'data': data, 'errors': errors} if errors else {'data': data})
+
+    async def start(self) -> str:
+        """Starts listening on a free local port and returns the base URL of the REST API"""
+        app = web.Application()
+        app.router.add_post('/graphql', self._handle_graphql)
+        app.router.add_get('/{username}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,73 @@
+import logging
+import time
+import metrics
+
+logger = logging.getLogger('LeetGo')
+
+# Values of the leetgo_circuit_state gauge
+STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitBreaker:
+    """Stops calling an unhealthy dependency until it has had time to recover
+
+    The circuit opens after ``failure_threshold`` consecutive failures, and calls
+    are rejected without being attempted. After ``reset_timeout`` seconds a
+    single probe is let through (half-open). If the probe succeeds the circuit
+    closes again; if it fails the circuit re-opens and the wait doubles, up to
+    ``max_reset_timeout``, so a long outage is probed less and less often.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._wait = reset_timeout
+        self._opened_at = 0.0
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[self.state], name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit {self.name} is now {state.replace('_', '-')}")
+            self.state = state
+            metrics.CIRCUIT_STATE.set(STATE_VALUES[state], self.name)
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next call is let through, 0 while the circuit is closed"""
+        if self.state == 'closed':
+            return 0.0
+        return max(0.0, self._opened_at + self._wait - time.monotonic())
+
+    def allow(self) -> bool:
+        """Returns whether a call may be attempted now; counts a rejection otherwise
+
+        A half-open circuit lets another probe through if the previous one has
+        not reported back within the wait, so a cancelled probe cannot wedge it.
+        """
+        if self.state == 'closed':
+            return True
+        if self.retry_after == 0:
+            self._opened_at = time.monotonic()
+            self._set_state('half_open')
+            return True
+        metrics.CIRCUIT_REJECTIONS.inc(self.name)
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._wait = self.reset_timeout
+        self._set_state('closed')
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open':
+            self._wait = min(self.max_reset_timeout, self._wait * 2)
+        elif self.failures < self.failure_threshold:
+            return
+        self._opened_at = time.monotonic()
+        self._set_state('open')
@@ -0,0 +1,150 @@
+from bisect import bisect_left, insort
+import re
+
+# Characters that start a new word inside a cohort name
+WORD_BOUNDARY = re.compile(r'[\s\-_]+')
+
+
+class CohortIndex:
+    """Sorted in-memory index of the cohort names of one guild
+
+    Every cohort is indexed under its full lower-cased name and under each
+    suffix that starts at a word boundary, so "grind" finds "blind-75-grind".
+    A search is a binary search followed by a walk over matching keys, and it
+    stops as soon as a page is filled, so its cost depends on the page size
+    rather than on the number of cohorts.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._keys = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def _index_keys(name: str) -> list:
+        """Returns the full name and every word-boundary suffix, lower-cased"""
+        lowered = name.lower()
+        keys = [lowered]
+        for match in WORD_BOUNDARY.finditer(lowered):
+            if match.end() < len(lowered):
+                keys.append(lowered[match.end():])
+        return keys
+
+    def load(self, cohorts: list):
+        """Replaces the index with (cohort_id, name) rows"""
+        self._names = {}
+        self._keys = []
+        for cohort_id, name in cohorts:
+            if name is None:
+                continue
+            self._names[cohort_id] = name
+            self._keys.extend((key, cohort_id) for key in self._index_keys(name))
+        self._keys.sort()
+
+    def add(self, cohort_id: int, name: str):
+        """Indexes a newly created cohort"""
+        self._names[cohort_id] = name
+        for key in self._index_keys(name):
+            insort(self._keys, (key, cohort_id))
+
+    def remove(self, cohort_id: int):
+        """Drops a cohort from the index"""
+        name = self._names.pop(cohort_id, None)
+        if name is None:
+            return
+        for key in self._index_keys(name):
+            index = bisect_left(self._keys, (key, cohort_id))
+            if index < len(self._keys) and self._keys[index] == (key, cohort_id):
+                self._keys.pop(index)
+
+    def get(self, cohort_id: int) -> str:
+        """Returns the name of a cohort, or None"""
+        return self._names.get(cohort_id)
+
+    def find(self, name: str) -> int:
+        """Returns the ID of the cohort with exactly this name (case-insensitive), or None"""
+        lowered = name.strip().lower()
+        index = bisect_left(self._keys, (lowered,))
+        while index < len(self._keys) and self._keys[index][0] == lowered:
+            cohort_id = self._keys[index][1]
+            if self._names[cohort_id].lower() == lowered:
+                return cohort_id
+            index += 1
+        return None
+
+    def _matches(self, query: str):
+        """Yields matching cohort IDs: full-name prefix matches first, then word matches"""
+        lowered = query.strip().lower()
+        start = bisect_left(self._keys, (lowered,))
+        seen = set()
+        word_matches = []
+        for index in range(start, len(self._keys)):
+            key, cohort_id = self._keys[index]
+            if not key.startswith(lowered):
+                break
+            if cohort_id in seen:
+                continue
+            if key == self._names[cohort_id].lower():
+                seen.add(cohort_id)
+                yield cohort_id
+            else:
+                word_matches.append(cohort_id)
+        for cohort_id in word_matches:
+            if cohort_id not in seen:
+                seen.add(cohort_id)
+                yield cohort_id
+
+    def search(self, query: str = '', limit: int = 25, offset: int = 0) -> list:
+        """Returns up to ``limit`` (cohort_id, name) matches after skipping ``offset``"""
+        results = []
+        for position, cohort_id in enumerate(self._matches(query or '')):
+            if position < offset:
+                continue
+            if len(results) == limit:
+                break
+            results.append((cohort_id, self._names[cohort_id]))
+        return results
+
+
+class CohortDirectory:
+    """Cohort name indexes sharded by guild
+
+    Each guild gets its own CohortIndex, so searching and autocompleting in one
+    server only ever touches that server's cohorts.
+    """
+
+    def __init__(self):
+        self._shards = {}
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards.values())
+
+    def load(self, cohorts: list):
+        """Replaces every shard with (cohort_id, guild_id, name) rows
+
+        Cohorts that are not attached to a guild yet are left out.
+        """
+        by_guild = {}
+        for cohort_id, guild_id, name in cohorts:
+            if guild_id is not None:
+                by_guild.setdefault(guild_id, []).append((cohort_id, name))
+        self._shards = {}
+        for guild_id, rows in by_guild.items():
+            self._shards[guild_id] = CohortIndex()
+            self._shards[guild_id].load(rows)
+
+    def shard(self, guild_id: int) -> CohortIndex:
+        """Returns the index of one guild, empty if it has no cohorts"""
+        return self._shards.get(guild_id) or CohortIndex()
+
+    def add(self, guild_id: int, cohort_id: int, name: str):
+        """Indexes a newly created cohort in its guild's shard"""
+        self._shards.setdefault(guild_id, CohortIndex()).add(cohort_id, name)
+
+    def remove(self, guild_id: int, cohort_id: int):
+        """Drops a cohort from its guild's shard"""
+        shard = self._shards.get(guild_id)
+        if shard is not None:
+            shard.remove(cohort_id)
@@ -1,76 +1,151 @@
+from contextlib import contextmanager
 import sqlite3
+import json
 import logging
+import time
+import migrations
 
 logger = logging.getLogger('LeetGo')
 
+# SQL expressions a cohort leaderboard can be ranked by; week_start is bound as the first parameter
+LEADERBOARD_METRICS = {
+    'total': 'l.total_solved',
+    'weekly': 'CASE WHEN l.week_start = ? THEN l.total_solved - l.week_baseline ELSE 0 END',
+    'hard': 'l.hard_solved',
+}
+
+# Keys of the dict returned by Database.get_user_profile
+PROFILE_COLUMNS = ('discord_id', 'discord_username', 'lc_username', 'cohort_id', 'cohort_name',
+                   'roadmap', 'goal_questions', 'goal_duration', 'goal_start_date', 'goal_baseline_solved',
+                   'reminder_hour', 'reminder_minute')
+
+# Shard that delivers a user's reminders; mirrors sharding.reminder_shard
+REMINDER_SHARD = '((COALESCE(home_guild_id, discord_id) >> 22) % ?)'
+
+# Total solved in the first snapshot taken on or after a user's goal start date,
+# used when no baseline was captured at /set-goal time
+GOAL_BASELINE_FALLBACK = '''(SELECT s.easy_solved + s.medium_solved + s.hard_solved FROM stats_snapshots s
+                             WHERE s.user_id = u.discord_id AND s.taken_at >= strftime('%s', u.goal_start_date)
+                             ORDER BY s.taken_at LIMIT 1)'''
+
+# Entities the admin CLI imports and exports in bulk, as (table, column rows are
+# matched on, columns with their types, condition selecting the entity's rows).
+# Goals and reminders are columns of users, so their rows are matched by user;
+# entities with a condition only update existing rows and never create them.
+BULK_ENTITIES = {
+    'cohorts': ('cohorts', 'cohort_id',
+                {'cohort_id': int, 'name': str, 'guild_id': int, 'channel_id': int}, None),
+    'users': ('users', 'discord_id',
+              {'discord_id': int, 'discord_username': str, 'lc_username': str, 'cohort_id': int, 'roadmap': str}, None),
+    'goals': ('users', 'discord_id',
+              {'discord_id': int, 'goal_questions': int, 'goal_duration': int, 'goal_start_date': str,
+               'goal_baseline_solved': int}, 'goal_questions IS NOT NULL'),
+    'reminders': ('users', 'discord_id',
+                  {'discord_id': int, 'home_guild_id': int, 'reminder_hour': int,
+                   'reminder_minute': int}, 'reminder_hour IS NOT NULL'),
+}
+
 
 class Database:
     """Provides a connection to a sqlite3 database"""
 
-    def __init__(self):
-        """Initializes sqlite and creates the necessary tables if they don't exist"""
+    def __init__(self, path: str = 'storage.db', migrate: bool = True):
+        """Opens sqlite, applies the connection pragmas and upgrades the schema
+
+        Args:
+            path: Location of the sqlite database file
+            migrate: Whether to run pending schema migrations on this connection
+        """
         try:
-            self.connection = sqlite3.connect('storage.db')
+            # Each connection is confined to a single worker thread by AsyncDatabase,
+            # which also closes it from the main thread on shutdown
+            self.connection = sqlite3.connect(path, check_same_thread=False)
             self.c = self.connection.cursor()
-            
-            # Create cohorts table
-            self.c.execute(
-                'CREATE TABLE IF NOT EXISTS cohorts(cohort_id INTEGER PRIMARY KEY, name TEXT)')
-            
-            # Create users table
-            self.c.execute('''CREATE TABLE IF NOT EXISTS users(
-                      user_id INTEGER PRIMARY KEY NOT NULL,
-                      cohort_id INTEGER,
-                      discord_username TEXT NOT NULL UNIQUE,
-                      lc_username TEXT,
-                      roadmap TEXT,
-                      goal_questions INTEGER,
-                      goal_duration INTEGER,
-                      goal_start_date TEXT,
-                      reminder_hour INTEGER,
-                      reminder_minute INTEGER,
-                      FOREIGN KEY(cohort_id) REFERENCES cohorts(cohort_id))''')
-            
-            self.connection.commit()
-            logger.info("Database initialized successfully")
+            self._batch_depth = 0
+            migrations.configure_connection(self.connection)
+
+            if migrate:
+                version = migrations.migrate(self.connection)
+                logger.info(f"Database initialized successfully (schema version {version})")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
 
-    def does_the_user_exist(self, discord_username) -> bool:
-        """Checks if the user exists in the database"""
-        try:
-            return self.c.execute('SELECT * FROM users WHERE discord_username=?',
-                                  (discord_username,)).fetchone() is not None
-        except Exception as e:
-            logger.error(f"Error checking if user exists: {e}")
-            return False
+    def _commit(self):
+        """Commits the current write unless it is part of a batch"""
+        if self._batch_depth == 0:
+            self.connection.commit()
 
-    def change_user_name(self, discord_username, lc_username):
-        """Changes the user's name in the database"""
+    @contextmanager
+    def batch(self):
+        """Groups the writes made inside the block into a single transaction
+
+        Setters called inside the block skip their own commit; one commit (and
+        one fsync) happens when the outermost block exits. If the block raises,
+        the whole batch is rolled back.
+        """
+        self._batch_depth += 1
         try:
-            self.c.execute('UPDATE users SET lc_username=? WHERE discord_username=?',
-                           (lc_username, discord_username))
+            yield self
+        except Exception:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.connection.rollback()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
             self.connection.commit()
-        except Exception as e:
-            logger.error(f"Error changing username: {e}")
+
+    @contextmanager
+    def savepoint(self):
+        """Runs the block inside a savepoint of the current transaction
+
+        If the block raises, only its own statements are undone and the rest of
+        the transaction (e.g. the other writes of a batch) is kept.
+        """
+        # A savepoint opened outside a transaction would commit on release
+        if not self.connection.in_transaction:
+            self.connection.execute('BEGIN')
+        self.connection.execute('SAVEPOINT write_call')
+        try:
+            yield self
+        except Exception:
+            self.connection.execute('ROLLBACK TO write_call')
+            self.connection.execute('RELEASE write_call')
             raise
+        self.connection.execute('RELEASE write_call')
 
-    def add_user(self, discord_username, lc_username):
-        """Adds a user to the database"""
+    def upsert_user(self, discord_id: int, discord_username: str, lc_username: str) -> bool:
+        """Registers a user or changes their LeetCode username in one atomic statement
+
+        The Discord username is refreshed as well, so renamed accounts show
+        their current name. Only the update branch sets username_updated_at,
+        which tells the two outcomes apart.
+
+        Returns:
+            True if the user was created, False if an existing row was updated
+        """
         try:
-            self.c.execute('INSERT INTO users (discord_username, lc_username) VALUES (?, ?)',
-                           (discord_username, lc_username))
-            self.connection.commit()
+            updated_at = self.c.execute('''INSERT INTO users (discord_id, discord_username, lc_username) VALUES (?, ?, ?)
+                                        ON CONFLICT(discord_id) DO UPDATE SET
+                                            discord_username = excluded.discord_username,
+                                            lc_username = excluded.lc_username,
+                                            username_updated_at = ?
+                                        RETURNING username_updated_at''',
+                                        (discord_id, discord_username, lc_username, int(time.time()))).fetchone()[0]
+            self._commit()
+            # Tested here rather than in RETURNING: sqlite 3.40 folds IS NULL there to false on tables whose
+            # INTEGER PRIMARY KEY is declared NOT NULL, as discord_id is
+            return updated_at is None
         except Exception as e:
-            logger.error(f"Error adding user: {e}")
+            logger.error(f"Error saving user {discord_username}: {e}")
             raise
 
-    def find_user(self, discord_username) -> str:
+    def find_user(self, discord_id: int) -> str:
         """Fetches leetcode username from the database"""
         try:
-            user = self.c.execute('SELECT lc_username FROM users WHERE discord_username=?',
-                                  (discord_username,)).fetchone()
+            user = self.c.execute('SELECT lc_username FROM users WHERE discord_id=?',
+                                  (discord_id,)).fetchone()
             if user:
                 return user[0]
             else:
@@ -79,19 +154,57 @@ class Database:
             logger.error(f"Error finding user: {e}")
             return None
 
+    def get_user_profile(self, discord_id: int) -> dict:
+        """Fetches every column of a user plus their cohort's name in one query
+
+        Returns:
+            A dict keyed by PROFILE_COLUMNS, or None if the user is not registered
+        """
+        try:
+            row = self.c.execute('''SELECT u.discord_id, u.discord_username, u.lc_username,
+                                        u.cohort_id, c.name, u.roadmap, u.goal_questions, u.goal_duration,
+                                        u.goal_start_date, u.goal_baseline_solved, u.reminder_hour, u.reminder_minute
+                                 FROM users u LEFT JOIN cohorts c ON c.cohort_id = u.cohort_id
+                                 WHERE u.discord_id=?''',
+                                 (discord_id,)).fetchone()
+            if row:
+                return dict(zip(PROFILE_COLUMNS, row))
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching user profile: {e}")
+            raise
+
     def get_all_cohorts(self) -> list:
-        """Fetches all cohorts from the database"""
+        """Fetches (cohort_id, guild_id, name) for every cohort"""
         try:
-            return self.c.execute('SELECT * FROM cohorts').fetchall()
+            return self.c.execute('SELECT cohort_id, guild_id, name FROM cohorts').fetchall()
         except Exception as e:
             logger.error(f"Error fetching cohorts: {e}")
             return []
 
-    def get_user_cohort(self, discord_username: str) -> int:
+    def get_unassigned_cohorts(self) -> list:
+        """Fetches (cohort_id, name) for cohorts created before cohorts were stored per guild"""
+        try:
+            return self.c.execute('SELECT cohort_id, name FROM cohorts WHERE guild_id IS NULL').fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching unassigned cohorts: {e}")
+            return []
+
+    def assign_cohort_guild(self, cohort_id: int, guild_id: int, channel_id: int):
+        """Attaches a cohort created before cohorts were stored per guild to its channel"""
+        try:
+            self.c.execute('UPDATE cohorts SET guild_id=?, channel_id=? WHERE cohort_id=?',
+                           (guild_id, channel_id, cohort_id))
+            self._commit()
+        except Exception as e:
+            logger.error(f"Error assigning cohort guild: {e}")
+            raise
+
+    def get_user_cohort(self, discord_id: int) -> int:
         """Fetches user's cohort id from the database"""
         try:
-            row = self.c.execute('SELECT cohort_id FROM users WHERE discord_username=?',
-                                    (discord_username,)).fetchone()
+            row = self.c.execute('SELECT cohort_id FROM users WHERE discord_id=?',
+                                    (discord_id,)).fetchone()
             if not row or row[0] is None:
                 return None
             return int(row[0])
@@ -99,23 +212,24 @@ class Database:
             logger.error(f"Error fetching user cohort: {e}")
             return None
 
-    def create_cohort(self, cohort_name: str, host_discord_name: str):
-        """Lets a user to host a cohort"""
+    def create_cohort(self, cohort_name: str, host_discord_id: int, guild_id: int, channel_id: int) -> int:
+        """Lets a user to host a cohort in a guild's channel and returns its ID"""
         try:
-            self.c.execute('INSERT INTO cohorts (name) VALUES (?)', (cohort_name,))
-            cohort_id = int(self.c.execute(
-                'SELECT cohort_id FROM cohorts WHERE name=?', (cohort_name, )).fetchone()[0])
-            self.update_user_cohort(host_discord_name, cohort_id)
+            self.c.execute('INSERT INTO cohorts (name, guild_id, channel_id) VALUES (?, ?, ?)',
+                           (cohort_name, guild_id, channel_id))
+            cohort_id = self.c.lastrowid
+            self.update_user_cohort(host_discord_id, cohort_id)
+            return cohort_id
         except Exception as e:
             logger.error(f"Error creating cohort: {e}")
             raise
 
-    def update_user_cohort(self, discord_username, cohort_id):
+    def update_user_cohort(self, discord_id: int, cohort_id: int):
         """Updates user's cohort in the database"""
         try:
-            self.c.execute('UPDATE users SET cohort_id=? WHERE discord_username=?',
-                           (cohort_id, discord_username))
-            self.connection.commit()
+            self.c.execute('UPDATE users SET cohort_id=? WHERE discord_id=?',
+                           (cohort_id, discord_id))
+            self._commit()
         except Exception as e:
             logger.error(f"Error updating user cohort: {e}")
             raise
@@ -132,31 +246,31 @@ class Database:
             logger.error(f"Error fetching cohort name: {e}")
             return None
 
-    def remove_user_from_cohort(self, discord_username: str):
+    def remove_user_from_cohort(self, discord_id: int):
         """Removes user from their current cohort"""
         try:
-            self.c.execute('UPDATE users SET cohort_id=NULL WHERE discord_username=?',
-                           (discord_username,))
-            self.connection.commit()
+            self.c.execute('UPDATE users SET cohort_id=NULL WHERE discord_id=?',
+                           (discord_id,))
+            self._commit()
         except Exception as e:
             logger.error(f"Error removing user from cohort: {e}")
             raise
 
-    def set_user_roadmap(self, discord_username: str, roadmap: str):
+    def set_user_roadmap(self, discord_id: int, roadmap: str):
         """Sets user's learning roadmap"""
         try:
-            self.c.execute('UPDATE users SET roadmap=? WHERE discord_username=?',
-                           (roadmap, discord_username))
-            self.connection.commit()
+            self.c.execute('UPDATE users SET roadmap=? WHERE discord_id=?',
+                           (roadmap, discord_id))
+            self._commit()
         except Exception as e:
             logger.error(f"Error setting user roadmap: {e}")
             raise
 
-    def get_user_roadmap(self, discord_username: str) -> str:
+    def get_user_roadmap(self, discord_id: int) -> str:
         """Fetches user's roadmap from the database"""
         try:
-            row = self.c.execute('SELECT roadmap FROM users WHERE discord_username=?',
-                                (discord_username,)).fetchone()
+            row = self.c.execute('SELECT roadmap FROM users WHERE discord_id=?',
+                                (discord_id,)).fetchone()
             if row:
                 return row[0]
             return None
@@ -164,23 +278,24 @@ class Database:
             logger.error(f"Error fetching user roadmap: {e}")
             return None
 
-    def set_user_goal(self, discord_username: str, questions: int, months: int, start_date: str):
-        """Sets user's goal"""
+    def set_user_goal(self, discord_id: int, questions: int, months: int, start_date: str,
+                      baseline_solved: int = None):
+        """Sets user's goal along with their total solved count when it was set, if known"""
         try:
-            self.c.execute('''UPDATE users SET goal_questions=?, goal_duration=?, goal_start_date=? 
-                           WHERE discord_username=?''',
-                           (questions, months, start_date, discord_username))
-            self.connection.commit()
+            self.c.execute('''UPDATE users SET goal_questions=?, goal_duration=?, goal_start_date=?, goal_baseline_solved=?
+                           WHERE discord_id=?''',
+                           (questions, months, start_date, baseline_solved, discord_id))
+            self._commit()
         except Exception as e:
             logger.error(f"Error setting user goal: {e}")
             raise
 
-    def get_user_goal(self, discord_username: str) -> tuple:
+    def get_user_goal(self, discord_id: int) -> tuple:
         """Fetches user's goal from the database"""
         try:
             row = self.c.execute('''SELECT goal_questions, goal_duration, goal_start_date 
-                                 FROM users WHERE discord_username=?''',
-                                (discord_username,)).fetchone()
+                                 FROM users WHERE discord_id=?''',
+                                (discord_id,)).fetchone()
             if row and row[0] is not None:
                 return row
             return None
@@ -188,21 +303,22 @@ class Database:
             logger.error(f"Error fetching user goal: {e}")
             return None
 
-    def set_user_reminder(self, discord_username: str, hour: int, minute: int):
-        """Sets user's reminder time"""
+    def set_user_reminder(self, discord_id: int, hour: int, minute: int, home_guild_id: int = None):
+        """Sets user's reminder time, recording the guild it was set from if given"""
         try:
-            self.c.execute('UPDATE users SET reminder_hour=?, reminder_minute=? WHERE discord_username=?',
-                           (hour, minute, discord_username))
-            self.connection.commit()
+            self.c.execute('''UPDATE users SET reminder_hour=?, reminder_minute=?, home_guild_id=COALESCE(?, home_guild_id)
+                           WHERE discord_id=?''',
+                           (hour, minute, home_guild_id, discord_id))
+            self._commit()
         except Exception as e:
             logger.error(f"Error setting user reminder: {e}")
             raise
 
-    def get_user_reminder(self, discord_username: str) -> tuple:
+    def get_user_reminder(self, discord_id: int) -> tuple:
         """Fetches user's reminder time from the database"""
         try:
-            row = self.c.execute('SELECT reminder_hour, reminder_minute FROM users WHERE discord_username=?',
-                                (discord_username,)).fetchone()
+            row = self.c.execute('SELECT reminder_hour, reminder_minute FROM users WHERE discord_id=?',
+                                (discord_id,)).fetchone()
             if row and row[0] is not None:
                 return row
             return None
@@ -210,20 +326,20 @@ class Database:
             logger.error(f"Error fetching user reminder: {e}")
             return None
 
-    def remove_user_reminder(self, discord_username: str):
+    def remove_user_reminder(self, discord_id: int):
         """Removes user's reminder"""
         try:
-            self.c.execute('UPDATE users SET reminder_hour=NULL, reminder_minute=NULL WHERE discord_username=?',
-                           (discord_username,))
-            self.connection.commit()
+            self.c.execute('UPDATE users SET reminder_hour=NULL, reminder_minute=NULL WHERE discord_id=?',
+                           (discord_id,))
+            self._commit()
         except Exception as e:
             logger.error(f"Error removing user reminder: {e}")
             raise
 
     def get_users_with_reminder_time(self, hour: int, minute: int) -> list:
-        """Fetches all users with reminders set for a specific time"""
+        """Fetches the Discord IDs of all users with reminders set for a specific time"""
         try:
-            rows = self.c.execute('''SELECT discord_username FROM users 
+            rows = self.c.execute('''SELECT discord_id FROM users 
                                   WHERE reminder_hour=? AND reminder_minute=?''',
                                  (hour, minute)).fetchall()
             return [row[0] for row in rows]
@@ -231,9 +347,323 @@ class Database:
             logger.error(f"Error fetching users with reminder time: {e}")
             return []
 
+    @staticmethod
+    def _shard_filter(shard_count: int, shard_ids: list) -> tuple:
+        """Returns an SQL condition and its parameters restricting users to the given reminder shards"""
+        if shard_count <= 1 or shard_ids is None:
+            return '', ()
+        placeholders = ', '.join('?' * len(shard_ids))
+        return f' AND {REMINDER_SHARD} IN ({placeholders})', (shard_count, *shard_ids)
+
+    def get_all_reminders(self, shard_count: int = 1, shard_ids: list = None) -> list:
+        """Fetches (discord_id, hour, minute) for every user with a reminder
+
+        With several shards, only the users whose reminders belong to one of
+        ``shard_ids`` are returned.
+        """
+        try:
+            condition, params = self._shard_filter(shard_count, shard_ids)
+            return self.c.execute(f'''SELECT discord_id, reminder_hour, reminder_minute FROM users
+                                  WHERE reminder_hour IS NOT NULL AND reminder_minute IS NOT NULL{condition}''',
+                                  params).fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching reminders: {e}")
+            return []
+
+    def get_due_reminders(self, hour: int, minute: int, shard_count: int = 1, shard_ids: list = None) -> list:
+        """Fetches the Discord IDs of the users on the given shards whose reminder is at this time"""
+        try:
+            condition, params = self._shard_filter(shard_count, shard_ids)
+            rows = self.c.execute(f'''SELECT discord_id FROM users
+                                  WHERE reminder_hour=? AND reminder_minute=?{condition}''',
+                                  (hour, minute, *params)).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f"Error fetching due reminders: {e}")
+            raise
+
+    def get_legacy_usernames(self) -> list:
+        """Fetches the Discord usernames of users registered before Discord IDs were stored"""
+        try:
+            return [row[0] for row in self.c.execute('SELECT discord_username FROM legacy_users').fetchall()]
+        except Exception as e:
+            logger.error(f"Error fetching legacy users: {e}")
+            return []
+
+    def claim_legacy_users(self, pairs: list) -> int:
+        """Keys legacy users by their Discord ID from (discord_username, discord_id) pairs
+
+        Each claimed user moves into users along with their snapshots and
+        leaderboard row. A Discord ID that already has a user keeps that user;
+        the legacy row is dropped either way.
+
+        Returns:
+            The number of users moved into users
+        """
+        try:
+            with self.batch():
+                self.c.execute('CREATE TEMP TABLE IF NOT EXISTS legacy_claims(user_id INTEGER, discord_id INTEGER)')
+                self.c.execute('DELETE FROM legacy_claims')
+                self.c.executemany('''INSERT INTO legacy_claims (user_id, discord_id)
+                                   SELECT user_id, ? FROM legacy_users WHERE discord_username=?''',
+                                   [(discord_id, discord_username) for discord_username, discord_id in pairs])
+                self.c.execute(f'''INSERT OR IGNORE INTO users (discord_id, {migrations.USER_COLUMNS})
+                               SELECT k.discord_id, {migrations.USER_COLUMNS}
+                               FROM legacy_claims k JOIN legacy_users l ON l.user_id = k.user_id''')
+                claimed = self.c.rowcount
+                self.c.execute('''UPDATE stats_snapshots SET user_id = k.discord_id
+                               FROM legacy_claims k WHERE stats_snapshots.user_id = k.user_id''')
+                self.c.execute('''UPDATE OR IGNORE leaderboard_stats SET user_id = k.discord_id
+                               FROM legacy_claims k WHERE leaderboard_stats.user_id = k.user_id''')
+                self.c.execute('''DELETE FROM leaderboard_stats
+                               WHERE user_id IN (SELECT user_id FROM legacy_claims)''')
+                self.c.execute('''DELETE FROM legacy_users
+                               WHERE user_id IN (SELECT user_id FROM legacy_claims)''')
+                self.c.execute('DELETE FROM legacy_claims')
+            return claimed
+        except Exception as e:
+            logger.error(f"Error claiming {len(pairs)} legacy users: {e}")
+            raise
+
+    def get_lc_usernames_page(self, after_discord_id: int, limit: int) -> list:
+        """Fetches up to ``limit`` (discord_id, lc_username) pairs with discord_id above ``after_discord_id``
+
+        Keyset pagination keeps every page an indexed range scan, so walking
+        all users costs the same per page no matter how far in we are.
+        """
+        try:
+            return self.c.execute('''SELECT discord_id, lc_username FROM users
+                                  WHERE discord_id > ? AND lc_username IS NOT NULL
+                                  ORDER BY discord_id LIMIT ?''',
+                                  (after_discord_id, limit)).fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching LeetCode usernames: {e}")
+            return []
+
+    def add_stats_snapshots(self, snapshots: list):
+        """Appends (user_id, taken_at, easy, medium, hard, ranking) rows in one transaction
+
+        The leaderboard aggregates of the same users are updated in the same
+        transaction. When a snapshot opens a new week, the previous total
+        becomes that week's baseline for the weekly delta.
+        """
+        try:
+            self.c.executemany('''INSERT INTO stats_snapshots
+                               (user_id, taken_at, easy_solved, medium_solved, hard_solved, ranking)
+                               VALUES (?, ?, ?, ?, ?, ?)''', snapshots)
+            self.c.executemany('''INSERT INTO leaderboard_stats
+                               (user_id, total_solved, hard_solved, week_start, week_baseline, updated_at)
+                               VALUES (?, ?, ?, ?, ?, ?)
+                               ON CONFLICT(user_id) DO UPDATE SET
+                                   week_baseline = CASE WHEN leaderboard_stats.week_start = excluded.week_start
+                                                        THEN leaderboard_stats.week_baseline
+                                                        ELSE leaderboard_stats.total_solved END,
+                                   week_start = excluded.week_start,
+                                   total_solved = excluded.total_solved,
+                                   hard_solved = excluded.hard_solved,
+                                   updated_at = excluded.updated_at
+                               WHERE excluded.updated_at >= leaderboard_stats.updated_at''',
+                               [(user_id, easy + medium + hard, hard, migrations.week_start(taken_at),
+                                 easy + medium + hard, taken_at)
+                                for user_id, taken_at, easy, medium, hard, _ in snapshots])
+            self._commit()
+        except Exception as e:
+            logger.error(f"Error adding stats snapshots: {e}")
+            raise
+
+    def get_cohort_leaderboard(self, cohort_id: int, metric: str, week_start: str = None, limit: int = 10) -> list:
+        """Fetches the top members of a cohort from the leaderboard aggregates
+
+        Args:
+            cohort_id: Cohort to rank
+            metric: One of LEADERBOARD_METRICS
+            week_start: ISO date of the current week's Monday, defaults to this week
+            limit: Number of members to return
+
+        Returns:
+            (discord_username, lc_username, total_solved, weekly_delta, hard_solved) rows, best first
+        """
+        try:
+            week_start = week_start or migrations.week_start(int(time.time()))
+            order = LEADERBOARD_METRICS[metric]
+            weekly = LEADERBOARD_METRICS['weekly']
+            return self.c.execute(f'''SELECT u.discord_username, u.lc_username, l.total_solved,
+                                          {weekly}, l.hard_solved
+                                   FROM users u JOIN leaderboard_stats l ON l.user_id = u.discord_id
+                                   WHERE u.cohort_id = ?
+                                   ORDER BY {order} DESC, l.total_solved DESC
+                                   LIMIT ?''',
+                                  (week_start, cohort_id) + ((week_start,) if metric == 'weekly' else ()) + (limit,)
+                                  ).fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching cohort leaderboard: {e}")
+            return []
+
+    def get_latest_solved(self, discord_id: int) -> int:
+        """Fetches a user's most recently recorded total solved count"""
+        try:
+            row = self.c.execute('SELECT total_solved FROM leaderboard_stats WHERE user_id=?',
+                                 (discord_id,)).fetchone()
+            if row:
+                return row[0]
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching latest solved count: {e}")
+            return None
+
+    def get_goal_baseline(self, discord_id: int) -> int:
+        """Fetches a user's goal baseline, falling back to the first snapshot after the goal started"""
+        try:
+            row = self.c.execute(f'''SELECT COALESCE(u.goal_baseline_solved, {GOAL_BASELINE_FALLBACK})
+                                   FROM users u WHERE u.discord_id=?''', (discord_id,)).fetchone()
+            if row:
+                return row[0]
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching goal baseline: {e}")
+            return None
+
+    def get_active_goals(self) -> list:
+        """Fetches every goal that can be evaluated from recorded stats in one query
+
+        Returns:
+            (discord_id, goal_questions, goal_duration, goal_start_date, baseline_solved, current_solved) rows
+        """
+        try:
+            return self.c.execute(f'''SELECT u.discord_id, u.goal_questions, u.goal_duration, u.goal_start_date,
+                                          COALESCE(u.goal_baseline_solved, {GOAL_BASELINE_FALLBACK}),
+                                          l.total_solved
+                                   FROM users u JOIN leaderboard_stats l ON l.user_id = u.discord_id
+                                   WHERE u.goal_questions IS NOT NULL''').fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching active goals: {e}")
+            return []
+
+    def get_bot_state(self, key: str) -> str:
+        """Fetches a persisted bot setting, or None if it was never stored"""
+        try:
+            row = self.c.execute('SELECT value FROM bot_state WHERE key=?', (key,)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error fetching bot state {key}: {e}")
+            return None
+
+    def set_bot_state(self, key: str, value: str):
+        """Stores a bot setting, replacing any previous value"""
+        try:
+            self.c.execute('''INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)
+                           ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at''',
+                           (key, value, int(time.time())))
+            self._commit()
+        except Exception as e:
+            logger.error(f"Error storing bot state {key}: {e}")
+            raise
+
+    def get_last_good_stats(self, lc_username: str) -> tuple:
+        """Fetches the last successfully fetched stats of a LeetCode user
+
+        Returns:
+            (stats dict, unix time it was fetched), or None if none were stored
+        """
+        try:
+            row = self.c.execute('SELECT payload, fetched_at FROM last_good_stats WHERE lc_username=?',
+                                 (lc_username,)).fetchone()
+            return (json.loads(row[0]), row[1]) if row else None
+        except Exception as e:
+            logger.error(f"Error fetching last good stats for {lc_username}: {e}")
+            return None
+
+    def save_last_good_stats(self, stats: dict, fetched_at: int):
+        """Stores the stats of LeetCode users keyed by username, replacing their previous copies"""
+        try:
+            self.c.executemany('''INSERT INTO last_good_stats (lc_username, payload, fetched_at) VALUES (?, ?, ?)
+                               ON CONFLICT(lc_username) DO UPDATE SET payload = excluded.payload,
+                                                                      fetched_at = excluded.fetched_at''',
+                               [(lc_username, json.dumps(results), fetched_at) for lc_username, results in stats.items()])
+            self._commit()
+        except Exception as e:
+            logger.error(f"Error storing last good stats for {len(stats)} users: {e}")
+            raise
+
+    def export_rows(self, entity: str, chunk_size: int = 1000):
+        """Yields the rows of a bulk entity as tuples in BULK_ENTITIES column order
+
+        Rows are read ``chunk_size`` at a time on a cursor of their own, so memory
+        stays constant however large the table is.
+        """
+        table, key, columns, condition = BULK_ENTITIES[entity]
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f'SELECT {", ".join(columns)} FROM {table}'
+                           f'{f" WHERE {condition}" if condition else ""} ORDER BY {key}')
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        except Exception as e:
+            logger.error(f"Error exporting {entity}: {e}")
+            raise
+
+    def import_rows(self, entity: str, columns: list, rows) -> tuple:
+        """Inserts or updates bulk entity rows with a single executemany
+
+        Only the given columns are written, so importing a file without e.g. a
+        roadmap column keeps the roadmaps already stored, and updating a
+        LeetCode username records when, as upsert_user does. Goals and
+        reminders only update registered users; their rows for unknown users
+        are skipped, as are rows an entity without other columns already has.
+
+        Args:
+            entity: Key of BULK_ENTITIES
+            columns: Columns of each row, including the entity's key column
+            rows: Iterable of tuples in ``columns`` order, consumed lazily
+
+        Returns:
+            (rows created, rows updated, rows skipped)
+        """
+        table, key, _, condition = BULK_ENTITIES[entity]
+        key_index = columns.index(key)
+        updated_columns = [column for column in columns if column != key]
+        read = 0
+
+        def counted(values):
+            nonlocal read
+            for row in values:
+                read += 1
+                yield row
+
+        try:
+            if condition is not None:
+                if not updated_columns:
+                    raise ValueError(f"The {entity} file has no columns to update")
+                self.c.executemany(f'UPDATE {table} SET {", ".join(f"{column} = ?" for column in updated_columns)} '
+                                   f'WHERE {key} = ?',
+                                   (row[:key_index] + row[key_index + 1:] + (row[key_index],) for row in counted(rows)))
+                created, written = 0, self.c.rowcount
+            else:
+                updates = [f'{column} = excluded.{column}' for column in updated_columns]
+                if table == 'users' and 'lc_username' in columns:
+                    updates.append("username_updated_at = CAST(strftime('%s', 'now') AS INTEGER)")
+                conflict = f'DO UPDATE SET {", ".join(updates)}' if updates else 'DO NOTHING'
+                before = self.c.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                self.c.executemany(f'INSERT INTO {table} ({", ".join(columns)}) '
+                                   f'VALUES ({", ".join("?" * len(columns))}) ON CONFLICT({key}) {conflict}',
+                                   counted(rows))
+                written = self.c.rowcount
+                created = self.c.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] - before
+            self._commit()
+            return created, written - created, read - written
+        except Exception as e:
+            logger.error(f"Error importing {entity}: {e}")
+            raise
+
     def kill(self):
         """Safely closes the sqlite connection before the instance of the class is removed"""
         try:
+            if self.connection.in_transaction:
+                self.connection.commit()
+                logger.info("Flushed pending database writes")
             self.connection.close()
             logger.info("Database connection closed")
         except Exception as e:
@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+# Average length of a month in days, used to turn goal durations into deadlines
+DAYS_PER_MONTH = 30.44
+
+
+def goal_progress(goal_questions: int, goal_months: int, start_date: str, baseline_solved: int,
+                  current_solved: int, today: date = None) -> dict:
+    """Computes how a user is doing against their goal
+
+    Args:
+        goal_questions: Number of questions the user committed to
+        goal_months: Duration of the goal in months
+        start_date: ISO date the goal was set
+        baseline_solved: Total solved when the goal was set
+        current_solved: Total solved now
+        today: Date to evaluate at, defaults to today
+
+    Returns:
+        A dict with solved, remaining, required_rate and actual_rate (questions
+        per day), expected (questions that should be solved by now), on_pace,
+        deadline and projected_completion (None when nothing was solved yet),
+        or None if the baseline is still unknown
+    """
+    if baseline_solved is None or current_solved is None:
+        return None
+    today = today or date.today()
+    start = date.fromisoformat(start_date)
+    total_days = max(1, round(goal_months * DAYS_PER_MONTH))
+    days_elapsed = min(total_days, max(1, (today - start).days + 1))
+
+    solved = max(0, current_solved - baseline_solved)
+    remaining = max(0, goal_questions - solved)
+    required_rate = goal_questions / total_days
+    actual_rate = solved / days_elapsed
+    expected = min(goal_questions, required_rate * days_elapsed)
+
+    if remaining == 0:
+        projected_completion = today
+    elif actual_rate > 0:
+        projected_completion = today + timedelta(days=round(remaining / actual_rate))
+    else:
+        projected_completion = None
+
+    return {
+        'solved': solved,
+        'remaining': remaining,
+        'required_rate': required_rate,
+        'actual_rate': actual_rate,
+        'expected': expected,
+        'on_pace': solved >= expected,
+        'deadline': start + timedelta(days=total_days),
+        'projected_completion': projected_completion,
+    }
+
+
+def evaluate_goals(goals: list, today: date = None) -> dict:
+    """Evaluates every active goal in one pass
+
+    Args:
+        goals: Rows from Database.get_active_goals
+        today: Date to evaluate at, defaults to today
+
+    Returns:
+        A dict mapping each user's Discord ID to their goal_progress result
+    """
+    today = today or date.today()
+    return {
+        discord_id: progress
+        for discord_id, questions, months, start_date, baseline, current in goals
+        if (progress := goal_progress(questions, months, start_date, baseline, current, today)) is not None
+    }
+
+
+def format_progress(progress: dict) -> str:
+    """Renders a goal_progress result as an embed field value"""
+    status = '✅ On pace' if progress['on_pace'] else '⚠️ Behind pace'
+    lines = [
+        f"{status}: **{progress['solved']}** solved, {progress['expected']:.0f} expected by now",
+        f"• Needed: {progress['required_rate']:.2f}/day · Actual: {progress['actual_rate']:.2f}/day",
+    ]
+    if progress['projected_completion']:
+        lines.append(f"• Projected completion: {progress['projected_completion']:%Y-%m-%d} "
+                     f"(deadline {progress['deadline']:%Y-%m-%d})")
+    else:
+        lines.append(f"• Deadline: {progress['deadline']:%Y-%m-%d}")
+    return "\n".join(lines)
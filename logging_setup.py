@@ -0,0 +1,117 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from os import getenv
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(correlation_id)s - %(message)s'
+
+# Fields describing the work the current task is doing (interaction ID, command,
+# user, ...). Each interaction and background job runs in its own asyncio task,
+# so setting them in one never leaks into another.
+log_context = ContextVar('log_context', default={})
+
+
+def bind(**fields):
+    """Adds fields to the log context of the current task; the first call should set correlation_id"""
+    log_context.set({**log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current log context onto each record
+
+    It runs on the thread that logs, before the record is queued, because the
+    listener thread cannot see the caller's context variables.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        record.correlation_id = context.get('correlation_id', '-')
+        record.context = context
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'context', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+
+def _gzip_rotator(source: str, destination: str):
+    """Compresses a rotated log file; runs on the listener thread, never on the event loop"""
+    with open(source, 'rb') as f_in, gzip.open(destination, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _file_handler(path: str) -> logging.Handler:
+    """Builds the rotating file handler described by the LOG_* environment variables"""
+    backup_count = int(getenv('LOG_BACKUP_COUNT', '5'))
+    rotate_when = getenv('LOG_ROTATE_WHEN', '')
+    if rotate_when:
+        handler = TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count,
+                                           encoding='utf-8', delay=True)
+    else:
+        handler = RotatingFileHandler(path, maxBytes=int(getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                                      backupCount=backup_count, encoding='utf-8', delay=True)
+    if getenv('LOG_COMPRESS', '1') != '0':
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def configure_logging() -> QueueListener:
+    """Routes every log record through a queue to handlers running on a background thread
+
+    Logging calls only enqueue the record, so a slow disk or a log rotation
+    never blocks the event loop. Like ``logging.basicConfig``, this does nothing
+    if the root logger already has handlers.
+
+    Returns:
+        The started listener, to be stopped on shutdown, or None if logging
+        was already configured
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    if getenv('LOG_FORMAT', 'text').lower() == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    log_file = getenv('LOG_FILE', 'leetgo.log')
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(getenv('LOG_LEVEL', 'INFO').upper())
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,33 +1,162 @@
 from os import getenv
-import requests
 from dotenv import load_dotenv
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
-from database import Database
+from discord.ext import commands
+from async_database import AsyncDatabase
+from stats_client import StatsError, StatsTimeoutError, create_stats_provider
+from stats_cache import StatsCache
+from stats_ingester import StatsIngester, snapshot_from_stats
+from reminder_scheduler import ReminderScheduler
+from reminder_delivery import RecipientResolver, ReminderDispatcher
+from goals import evaluate_goals, format_progress, goal_progress
+from cohort_directory import CohortDirectory
+from sharding import reminder_shard, shard_config
+from singleflight import SingleFlight
+import logging_setup
+import metrics
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
 import logging
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('leetgo.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger('LeetGo')
+import time
 
 load_dotenv()
 
+# Configure logging; records are written by a background thread
+logging_setup.configure_logging()
+logger = logging.getLogger('LeetGo')
+logger.addHandler(metrics.ErrorLogCounter())
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-# Initialize local database instance
-db = Database()
+# Initialize local database instance; queries run on background threads
+db = AsyncDatabase()
+
+# Shared, connection-pooled source of LeetCode stats, selected by STATS_PROVIDER
+stats_client = create_stats_provider()
+stats_cache = StatsCache()
+stats_flight = SingleFlight('stats')
+
+
+async def remember_stats(stats: dict):
+    """Keeps a durable copy of fetched stats, keyed by username, to fall back on while the stats API is down"""
+    found = {username: results for username, results in stats.items()
+             if isinstance(results, dict) and results.get('status') != 'error'}
+    if not found:
+        return
+    try:
+        await db.save_last_good_stats(found, int(time.time()))
+    except Exception as e:
+        logger.warning(f"Could not keep last good stats for {len(found)} users: {e}")
+
+
+async def fetch_and_remember_stats(lc_username: str) -> dict:
+    """Fetches one user's stats and keeps a durable copy of them"""
+    results = await stats_client.fetch(lc_username)
+    await remember_stats({lc_username: results})
+    return results
+
+
+async def fetch_stats(lc_username: str) -> dict:
+    """Fetches stats, sharing one upstream request between concurrent lookups of the same user"""
+    results = await stats_flight.do(lc_username.lower(), fetch_and_remember_stats, lc_username)
+    if results is None:
+        # Joined an ingestion batch that could not fetch this user
+        raise StatsError(f"Error fetching stats for {lc_username}")
+    return results
+
+
+async def fetch_and_remember_many_stats(lc_usernames: list) -> dict:
+    """Fetches a batch of users' stats and keeps a durable copy of them"""
+    stats = await stats_client.fetch_many(lc_usernames)
+    await remember_stats(stats)
+    return stats
+
+
+# Seconds before /stats records another snapshot of the same user
+STATS_SNAPSHOT_WINDOW = float(getenv('STATS_SNAPSHOT_WINDOW', '900'))
+# Fetch time of the last snapshot recorded from /stats, keyed by Discord ID
+stats_snapshot_times = {}
+
+
+async def record_stats_snapshot(discord_id: int, results: dict, taken_at: float):
+    """Records stats shown by /stats as a snapshot, at most once per user per STATS_SNAPSHOT_WINDOW
+
+    This keeps the user's leaderboard aggregates as current as what they just saw
+    instead of waiting for the next ingestion pass. ``taken_at`` is when the
+    stats were fetched upstream, so a stale cached copy never passes for newer
+    stats than the ingester recorded.
+    """
+    if taken_at - stats_snapshot_times.get(discord_id, 0) < STATS_SNAPSHOT_WINDOW:
+        return
+    stats_snapshot_times[discord_id] = taken_at
+    try:
+        await db.add_stats_snapshots([snapshot_from_stats(discord_id, results, int(taken_at))])
+    except Exception as e:
+        logger.warning(f"Could not record stats snapshot for {discord_id}: {e}")
+
+
+def format_age(seconds: float) -> str:
+    """Formats a duration as a rough human age such as '5 minutes' or '2 days'"""
+    for unit, length in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= length:
+            count = int(seconds // length)
+            return f"{count} {unit}{'s' if count > 1 else ''}"
+    return 'less than a minute'
+
+# In-memory index of cohort names per guild for search and autocomplete
+cohort_directory = CohortDirectory()
+
+# In-memory schedule of the daily reminders owned by this process's shards
+reminder_scheduler = ReminderScheduler()
+reminder_task = None
+
+# Seconds between reloads of the owned reminders when other processes run the remaining shards
+REMINDER_SYNC_INTERVAL = float(getenv('REMINDER_SYNC_INTERVAL', '60'))
+
+
+async def fetch_and_cache_many_stats(lc_usernames: list) -> dict:
+    """Fetches fresh stats for a batch of users and stores them in the cache for /stats
+
+    Users already being fetched for /stats join that request, and /stats lookups
+    of the batch's users made meanwhile join the batch.
+    """
+    usernames = {lc_username.lower(): lc_username for lc_username in lc_usernames}
+    found = await stats_flight.do_many(usernames, fetch_and_remember_many_stats)
+    stats = {usernames[key]: results for key, results in found.items() if results is not None}
+    for lc_username, results in stats.items():
+        stats_cache.put(lc_username, results)
+    return stats
+
+
+# Goal progress of every user with a goal, keyed by Discord ID, for reminder digests
+goal_digest = {}
+
+# Seconds between re-evaluations of the goal digest, in every process
+GOAL_DIGEST_INTERVAL = float(getenv('GOAL_DIGEST_INTERVAL', '900'))
+
+
+async def refresh_goal_digest():
+    """Re-evaluates every active goal from the recorded stats in one pass"""
+    global goal_digest
+    goal_digest = evaluate_goals(await db.get_active_goals())
+    logger.info(f"Evaluated {len(goal_digest)} active goals")
+
+
+# Set once legacy cohorts were matched to their guild, so reconnects skip it
+legacy_cohorts_checked = False
+
+# Discord usernames of users registered before Discord IDs were stored, until they are claimed
+legacy_usernames = set()
+
+# Periodic snapshots of every registered user's stats
+stats_ingester = StatsIngester(db, fetch_and_cache_many_stats, stats_client.batch_size, after_pass=refresh_goal_digest)
+ingest_task = None
 
 # Roadmap options
 ROADMAPS = {
@@ -50,47 +179,192 @@ ROADMAPS = {
 }
 
 
-def set_user(discord_username, lc_username):
-    """Adds or edits a user's name in the database"""
+async def set_user(discord_id: int, discord_username: str, lc_username: str) -> bool:
+    """Adds or edits a user's name in the database, returning True if the user is new"""
     try:
-        if db.does_the_user_exist(discord_username):
-            db.change_user_name(discord_username, lc_username)
-            logger.info(f"Updated username for {discord_username} to {lc_username}")
-        else:
-            db.add_user(discord_username, lc_username)
+        created = await db.upsert_user(discord_id, discord_username, lc_username)
+        if created:
             logger.info(f"Added new user {discord_username} with LeetCode username {lc_username}")
+        else:
+            logger.info(f"Updated username for {discord_username} to {lc_username}")
+        return created
     except Exception as e:
         logger.error(f"Error setting user {discord_username}: {e}")
         raise
 
 
-bot = commands.Bot(command_prefix='$',
-                   description='LeetGo is a bot that allows programmers to keep track of their LeetCode progress.', intents=intents)
+loop_monitor_task = None
+
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that times every slash command and counts the ones that fail"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+        logging_setup.bind(correlation_id=str(interaction.id),
+                           command=interaction.command.qualified_name if interaction.command else None,
+                           user_id=interaction.user.id,
+                           guild_id=interaction.guild_id)
+        if str(interaction.user) in legacy_usernames:
+            await claim_legacy_users([interaction.user])
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        command = interaction.command.qualified_name if interaction.command else 'unknown'
+        observe_command(interaction, command)
+        metrics.COMMAND_ERRORS.inc(command)
+        logger.error(f"Unhandled error in command {command}: {error}", exc_info=error)
+
+
+def observe_command(interaction: discord.Interaction, command: str):
+    """Records how long a slash command took since the tree received it"""
+    started = interaction.extras.get('started')
+    if started is not None:
+        metrics.COMMAND_LATENCY.observe(time.perf_counter() - started, command)
+
+
+class LeetGoBot(commands.AutoShardedBot):
+    """Bot that flushes pending writes and releases shared resources when it shuts down"""
+
+    async def setup_hook(self):
+        """Runs once before connecting, so none of this is repeated on reconnects"""
+        global loop_monitor_task
+        await metrics_server.start()
+        loop_monitor_task = asyncio.create_task(metrics.monitor_event_loop())
+        if not runs_every_shard():
+            # Other processes write to the same users, so cached profiles must expire
+            db.profile_ttl = float(getenv('DB_PROFILE_CACHE_TTL', '5'))
+        try:
+            cohort_directory.load(await db.get_all_cohorts())
+            legacy_usernames.update(await db.get_legacy_usernames())
+            await sync_command_tree()
+        except Exception as e:
+            logger.error(f"Error during bot setup: {e}")
+
+    async def close(self):
+        if loop_monitor_task is not None:
+            loop_monitor_task.cancel()
+        await metrics_server.stop()
+        await stats_client.close()
+        await db.flush()
+        await super().close()
+
+
+shard_count, shard_ids = shard_config()
+bot = LeetGoBot(command_prefix='$',
+                description='LeetGo is a bot that allows programmers to keep track of their LeetCode progress.', intents=intents,
+                tree_cls=InstrumentedCommandTree, shard_count=shard_count, shard_ids=shard_ids)
+# REMINDER_RATE_PER_SECOND is the budget of the whole bot token, which every process
+# shares, so each process spends the share of its shards
+reminder_rate = float(getenv('REMINDER_RATE_PER_SECOND', '40'))
+if shard_ids is not None:
+    reminder_rate *= len(shard_ids) / shard_count
+reminder_dispatcher = ReminderDispatcher(RecipientResolver(bot), rate=reminder_rate)
+
+# Local Prometheus endpoint for the collected metrics. Processes that run only some
+# shards listen on METRICS_PORT plus their first shard ID, so they never collide.
+metrics_port = int(getenv('METRICS_PORT', '9108'))
+if metrics_port and shard_ids is not None:
+    metrics_port += min(shard_ids)
+metrics_server = metrics.MetricsServer(port=metrics_port)
+
+
+def owned_shards() -> tuple:
+    """Returns the total shard count and the shards run by this process"""
+    count = bot.shard_count or 1
+    return count, list(bot.shard_ids) if bot.shard_ids is not None else list(range(count))
+
+
+def runs_every_shard() -> bool:
+    count, ids = owned_shards()
+    return len(ids) == count
 
 
 @bot.event
 async def on_ready():
-    """Runs when the bot is up and ready"""
-    logger.info(f'Logged in as {bot.user.name}')
+    """Runs when the bot is up and ready, again after every reconnect"""
+    global reminder_task, ingest_task, legacy_cohorts_checked
+    shard_total, own_shards = owned_shards()
+    logger.info(f'Logged in as {bot.user.name} running shards {own_shards} of {shard_total}')
     try:
-        cohorts = db.get_all_cohorts()
-        logger.info(f"Active cohorts: {len(cohorts)}")
-        await bot.tree.sync()
-        logger.info("Command tree synced successfully")
+        # Matching channel names is only unambiguous when every guild is visible
+        if not legacy_cohorts_checked and runs_every_shard():
+            if await assign_legacy_cohorts():
+                cohort_directory.load(await db.get_all_cohorts())
+            legacy_cohorts_checked = True
+        logger.info(f"Active cohorts: {len(cohort_directory)}")
         
         # Start reminder task
-        if not check_reminders.is_running():
-            check_reminders.start()
+        if reminder_task is None or reminder_task.done():
+            reminder_task = asyncio.create_task(run_reminders())
             logger.info("Reminder task started")
+        
+        # Start stats ingestion task; with several processes only the one running shard 0 ingests
+        if stats_ingester.interval > 0 and 0 in own_shards and (ingest_task is None or ingest_task.done()):
+            ingest_task = asyncio.create_task(stats_ingester.run())
+            logger.info("Stats ingestion task started")
     except Exception as e:
         logger.error(f"Error during bot startup: {e}")
 
 
+async def assign_legacy_cohorts():
+    """Attaches cohorts created before cohorts were stored per guild to their channel
+
+    A cohort is only assigned when exactly one guild has a channel with its name
+    in the "Cohorts" category, so ambiguous names are left for an admin to fix.
+    """
+    unassigned = await db.get_unassigned_cohorts()
+    if not unassigned:
+        return 0
+    channels = {}
+    for guild in bot.guilds:
+        category = discord.utils.get(guild.categories, name='Cohorts')
+        if category:
+            for channel in category.channels:
+                channels.setdefault(channel.name, []).append((guild.id, channel.id))
+    assigned = 0
+    for cohort_id, name in unassigned:
+        matches = channels.get(name, [])
+        if len(matches) == 1:
+            await db.assign_cohort_guild(cohort_id, *matches[0])
+            assigned += 1
+    logger.info(f"Assigned {assigned} of {len(unassigned)} legacy cohorts to a guild")
+    return assigned
+
+
+def command_tree_hash() -> str:
+    """Hashes the payload Discord receives for the global commands"""
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_command_tree():
+    """Syncs the global commands only if they changed since the last successful sync
+
+    Syncing is a slow, rate-limited API call, so the hash of the last synced
+    tree is kept in the database. Set FORCE_COMMAND_SYNC=1 to sync anyway.
+    """
+    key = f'command_tree_hash:{bot.application_id}'
+    current = command_tree_hash()
+    if getenv('FORCE_COMMAND_SYNC') != '1' and await db.get_bot_state(key) == current:
+        logger.info("Command tree unchanged, skipping sync")
+        return
+    await bot.tree.sync()
+    await db.set_bot_state(key, current)
+    logger.info("Command tree synced successfully")
+
+
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Global error handler for events"""
     logger.error(f"Error in event {event}", exc_info=True)
 
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    """Records the latency of every slash command that finished"""
+    observe_command(interaction, command.qualified_name)
+
 @bot.tree.command(name='set-username', description='Set or change your LeetCode username')
 @app_commands.describe(username='What\'s your LeetCode username?')
 async def set_username(interaction: discord.Interaction, username: str):
@@ -101,7 +375,7 @@ async def set_username(interaction: discord.Interaction, username: str):
             return
         
         username = username.strip()
-        set_user(str(interaction.user), username)
+        await set_user(interaction.user.id, str(interaction.user), username)
         await interaction.response.send_message(f'✅ Done! {interaction.user}\'s username is now set to **{username}**')
         logger.info(f"User {interaction.user} set LeetCode username to {username}")
     except Exception as e:
@@ -134,7 +408,7 @@ class RoadmapView(discord.ui.View):
         
         try:
             # Save roadmap to database
-            db.set_user_roadmap(str(interaction.user), self.value)
+            await db.set_user_roadmap(interaction.user.id, self.value)
             
             embed = discord.Embed(
                 title=f"📚 {self.value} Roadmap Selected",
@@ -159,13 +433,13 @@ async def roadmap(interaction: discord.Interaction):
     """Slash command that allows the user to select a roadmap"""
     try:
         # Check if user has set their username
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your LeetCode username first using `/set-username`.', ephemeral=True)
             return
         
         # Check if user already has a roadmap
-        current_roadmap = db.get_user_roadmap(str(interaction.user))
+        current_roadmap = profile['roadmap']
         
         embed = discord.Embed(
             title="🗺️ Choose Your Learning Path",
@@ -197,12 +471,16 @@ async def host_a_cohort(interaction: discord.Interaction, name: str):
             await interaction.response.send_message('❌ Please provide a valid cohort name.', ephemeral=True)
             return
         
+        if interaction.guild is None:
+            await interaction.response.send_message('❌ Cohorts can only be hosted inside a server.', ephemeral=True)
+            return
+        
         name = name.strip()
         channel_name = name.lower().replace(' ', '-')
         
         # Check if user has set their username
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your LeetCode username first using `/set-username`.', ephemeral=True)
             return
         
@@ -221,12 +499,17 @@ async def host_a_cohort(interaction: discord.Interaction, name: str):
             await interaction.response.send_message(f'❌ Channel **{channel_name}** already exists!', ephemeral=True)
             return
 
-        if db.get_user_cohort(str(interaction.user)):
+        if profile['cohort_id']:
             await interaction.response.send_message('❌ You cannot join more than one cohort at a time. Please use `/leave-cohort` first.', ephemeral=True)
             return
 
-        db.create_cohort(channel_name, str(interaction.user))
         new_channel = await interaction.guild.create_text_channel(channel_name, category=existing_category)
+        try:
+            cohort_id = await db.create_cohort(channel_name, interaction.user.id, interaction.guild.id, new_channel.id)
+        except Exception:
+            await new_channel.delete(reason='Cohort could not be saved')
+            raise
+        cohort_directory.add(interaction.guild.id, cohort_id, channel_name)
         
         # Send welcome message to the new cohort channel
         welcome_embed = discord.Embed(
@@ -250,20 +533,42 @@ async def host_a_cohort(interaction: discord.Interaction, name: str):
         logger.error(f"Error in host_a_cohort command: {e}")
         await interaction.response.send_message('❌ An error occurred while creating the cohort. Please try again.', ephemeral=True)
 
+COHORTS_PER_PAGE = 25  # Discord limit for select menu options
+
+
+def joined_cohort_embed(cohort_name: str) -> discord.Embed:
+    """Builds the confirmation shown after joining a cohort"""
+    embed = discord.Embed(
+        title="✅ Successfully Joined Cohort",
+        description=f"You are now a member of **{cohort_name}**!",
+        color=discord.Color.green()
+    )
+    embed.set_footer(text="Good luck with your studies!")
+    return embed
+
+
 class CohortSelectView(discord.ui.View):
-    """View for selecting a cohort to join"""
-    def __init__(self, user_id: int, cohorts: list):
+    """Paginated view for selecting a cohort to join"""
+    def __init__(self, user_id: int, guild_id: int, query: str = '', page: int = 0):
         super().__init__(timeout=180)
         self.user_id = user_id
+        self.guild_id = guild_id
+        self.query = query
+        self.page = page
         self.value = None
         
+        # Fetch one extra match to know whether there is a next page
+        matches = cohort_directory.shard(guild_id).search(query, limit=COHORTS_PER_PAGE + 1, offset=page * COHORTS_PER_PAGE)
+        self.has_next = len(matches) > COHORTS_PER_PAGE
+        self.cohorts = matches[:COHORTS_PER_PAGE]
+        
         options = [
             discord.SelectOption(
-                label=cohort[1],
-                description=f"Cohort ID: {cohort[0]}",
-                value=str(cohort[0])
+                label=name,
+                description=f"Cohort ID: {cohort_id}",
+                value=str(cohort_id)
             )
-            for cohort in cohorts[:25]  # Discord limit
+            for cohort_id, name in self.cohorts
         ]
         
         select = discord.ui.Select(
@@ -271,54 +576,101 @@ class CohortSelectView(discord.ui.View):
             options=options
         )
         select.callback = self.select_cohort
+        self.select = select
         self.add_item(select)
+        
+        if page > 0 or self.has_next:
+            previous_button = discord.ui.Button(label="◀ Previous", style=discord.ButtonStyle.secondary, disabled=page == 0)
+            previous_button.callback = self.previous_page
+            next_button = discord.ui.Button(label="Next ▶", style=discord.ButtonStyle.secondary, disabled=not self.has_next)
+            next_button.callback = self.next_page
+            self.add_item(previous_button)
+            self.add_item(next_button)
+    
+    async def _show_page(self, interaction: discord.Interaction, page: int):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("This menu is not for you!", ephemeral=True)
+            return
+        await interaction.response.edit_message(view=CohortSelectView(self.user_id, self.guild_id, self.query, page))
+    
+    async def previous_page(self, interaction: discord.Interaction):
+        await self._show_page(interaction, max(0, self.page - 1))
+    
+    async def next_page(self, interaction: discord.Interaction):
+        await self._show_page(interaction, self.page + 1)
     
     async def select_cohort(self, interaction: discord.Interaction):
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("This menu is not for you!", ephemeral=True)
             return
         
-        cohort_id = int(self.children[0].values[0])
-        cohort_name = next(opt.label for opt in self.children[0].options if opt.value == str(cohort_id))
+        cohort_id = int(self.select.values[0])
+        cohort_name = cohort_directory.shard(self.guild_id).get(cohort_id)
         
         try:
-            db.update_user_cohort(str(interaction.user), cohort_id)
+            await db.update_user_cohort(interaction.user.id, cohort_id)
             
-            embed = discord.Embed(
-                title="✅ Successfully Joined Cohort",
-                description=f"You are now a member of **{cohort_name}**!",
-                color=discord.Color.green()
-            )
-            embed.set_footer(text="Good luck with your studies!")
-            
-            await interaction.response.edit_message(content=None, embed=embed, view=None)
+            await interaction.response.edit_message(content=None, embed=joined_cohort_embed(cohort_name), view=None)
             logger.info(f"User {interaction.user} joined cohort {cohort_name}")
         except Exception as e:
             logger.error(f"Error joining cohort: {e}")
             await interaction.response.send_message("❌ Error joining cohort. Please try again.", ephemeral=True)
 
+
+async def cohort_name_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    """Suggests this server's cohorts whose name or one of its words starts with what the user typed"""
+    if interaction.guild is None:
+        return []
+    return [
+        app_commands.Choice(name=name, value=str(cohort_id))
+        for cohort_id, name in cohort_directory.shard(interaction.guild.id).search(current, limit=COHORTS_PER_PAGE)
+    ]
+
+
 @bot.tree.command(name='join-a-cohort', description='Join an existing study cohort')
-async def join_a_cohort(interaction: discord.Interaction):
+@app_commands.describe(name='Start typing to search cohorts, or leave empty to browse them all')
+@app_commands.autocomplete(name=cohort_name_autocomplete)
+async def join_a_cohort(interaction: discord.Interaction, name: str = None):
     """Slash command that allows the user to join a cohort"""
     try:
+        if interaction.guild is None:
+            await interaction.response.send_message('❌ Cohorts can only be joined inside a server.', ephemeral=True)
+            return
+        
         # Check if user has set their username
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your LeetCode username first using `/set-username`.', ephemeral=True)
             return
         
         # Check if user is already in a cohort
-        if db.get_user_cohort(str(interaction.user)):
+        if profile['cohort_id']:
             await interaction.response.send_message('❌ You are already in a cohort. Use `/leave-cohort` first if you want to switch.', ephemeral=True)
             return
         
-        # Get all available cohorts
-        cohorts = db.get_all_cohorts()
-        
-        if not cohorts:
+        cohorts = cohort_directory.shard(interaction.guild.id)
+        if not len(cohorts):
             await interaction.response.send_message('❌ No cohorts available. Create one using `/host-a-cohort`!', ephemeral=True)
             return
         
+        # An autocomplete pick arrives as the cohort ID, typed text as a name or search
+        query = (name or '').strip()
+        cohort_id = int(query) if query.isdigit() and cohorts.get(int(query)) else None
+        if cohort_id is None and query:
+            cohort_id = cohorts.find(query)
+        
+        if cohort_id is not None:
+            cohort_name = cohorts.get(cohort_id)
+            await db.update_user_cohort(interaction.user.id, cohort_id)
+            await interaction.response.send_message(embed=joined_cohort_embed(cohort_name), ephemeral=True)
+            logger.info(f"User {interaction.user} joined cohort {cohort_name}")
+            return
+        
+        view = CohortSelectView(interaction.user.id, interaction.guild.id, query)
+        if not view.cohorts:
+            await interaction.response.send_message(f'❌ No cohorts match **{query}**.', ephemeral=True)
+            return
+        
         embed = discord.Embed(
             title="📚 Available Cohorts",
             description="Select a cohort to join from the dropdown below.",
@@ -329,8 +681,9 @@ async def join_a_cohort(interaction: discord.Interaction):
             value=str(len(cohorts)),
             inline=False
         )
+        if query:
+            embed.add_field(name="Search", value=query, inline=False)
         
-        view = CohortSelectView(interaction.user.id, cohorts)
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
         logger.info(f"User {interaction.user} opened cohort selection")
     except Exception as e:
@@ -341,14 +694,14 @@ async def join_a_cohort(interaction: discord.Interaction):
 async def leave_cohort(interaction: discord.Interaction):
     """Slash command that allows the user to leave their current cohort"""
     try:
-        cohort_id = db.get_user_cohort(str(interaction.user))
+        profile = await db.get_user_profile(interaction.user.id)
         
-        if not cohort_id:
+        if not profile or not profile['cohort_id']:
             await interaction.response.send_message('❌ You are not in any cohort.', ephemeral=True)
             return
         
-        cohort_name = db.get_cohort_name(cohort_id)
-        db.remove_user_from_cohort(str(interaction.user))
+        cohort_name = profile['cohort_name']
+        await db.remove_user_from_cohort(interaction.user.id)
         
         embed = discord.Embed(
             title="👋 Left Cohort",
@@ -363,6 +716,103 @@ async def leave_cohort(interaction: discord.Interaction):
         await interaction.response.send_message('❌ An error occurred. Please try again.', ephemeral=True)
 
 
+@bot.tree.command(name='cohort-leaderboard', description='Rank the members of your cohort')
+@app_commands.describe(metric='What to rank members by')
+@app_commands.choices(metric=[
+    app_commands.Choice(name='Total solved', value='total'),
+    app_commands.Choice(name='Solved this week', value='weekly'),
+    app_commands.Choice(name='Hard solved', value='hard'),
+])
+async def cohort_leaderboard(interaction: discord.Interaction, metric: app_commands.Choice[str] = None):
+    """Slash command that shows the cohort leaderboard from the stored aggregates"""
+    try:
+        profile = await db.get_user_profile(interaction.user.id)
+        
+        if not profile or not profile['cohort_id']:
+            await interaction.response.send_message('❌ You are not in any cohort. Join one using `/join-a-cohort`!', ephemeral=True)
+            return
+        
+        metric_value = metric.value if metric else 'total'
+        metric_name = metric.name if metric else 'Total solved'
+        rows = await db.get_cohort_leaderboard(profile['cohort_id'], metric_value)
+        
+        if not rows:
+            await interaction.response.send_message('ℹ️ No stats have been recorded for your cohort yet. Check back later!', ephemeral=True)
+            return
+        
+        medals = ['🥇', '🥈', '🥉']
+        lines = []
+        for rank, (discord_username, lc_username, total_solved, weekly_delta, hard_solved) in enumerate(rows, start=1):
+            prefix = medals[rank - 1] if rank <= len(medals) else f"**{rank}.**"
+            lines.append(f"{prefix} {discord_username} ({lc_username}) — "
+                         f"{total_solved} solved, +{weekly_delta} this week, {hard_solved} hard")
+        
+        embed = discord.Embed(
+            title=f"🏆 {profile['cohort_name']} Leaderboard",
+            description="\n".join(lines),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Ranked by: {metric_name}")
+        
+        await interaction.response.send_message(embed=embed)
+        logger.info(f"User {interaction.user} viewed leaderboard of cohort {profile['cohort_name']} by {metric_value}")
+    except Exception as e:
+        logger.error(f"Error in cohort_leaderboard command: {e}")
+        await interaction.response.send_message('❌ An error occurred. Please try again.', ephemeral=True)
+
+
+@bot.tree.command(name='bot-metrics', description='Show command, database and API latencies (admins only)')
+@app_commands.default_permissions(administrator=True)
+async def bot_metrics(interaction: discord.Interaction):
+    """Slash command that summarizes the collected metrics for server admins"""
+    try:
+        if not interaction.permissions.administrator:
+            await interaction.response.send_message('❌ Only server admins can view bot metrics.', ephemeral=True)
+            return
+        
+        def busiest(histogram, limit: int) -> str:
+            series = sorted(histogram.label_values(), key=lambda labels: -histogram.count(*labels))[:limit]
+            return "\n".join(f"• **{labels[0]}**: {histogram.describe(*labels)}" for labels in series) or 'No data yet'
+        
+        embed = discord.Embed(title="📈 Bot Metrics", color=discord.Color.blue())
+        embed.add_field(name="Commands", value=busiest(metrics.COMMAND_LATENCY, 8), inline=False)
+        embed.add_field(name="Database", value=busiest(metrics.DB_LATENCY, 8), inline=False)
+        leaders = metrics.SINGLEFLIGHT_CALLS.value('stats', 'leader')
+        coalesced = metrics.SINGLEFLIGHT_CALLS.value('stats', 'coalesced')
+        embed.add_field(name="Stats API",
+                        value=f"{busiest(metrics.STATS_LATENCY, 3)}\n"
+                              f"• Coalesced {coalesced:.0f} of {leaders + coalesced:.0f} lookups into in-flight requests\n"
+                              f"• Circuit {stats_client.breaker.state.replace('_', '-')}, "
+                              f"timeout {stats_client.current_timeout():.1f}s, "
+                              f"{metrics.CIRCUIT_REJECTIONS.value('stats'):.0f} calls failed fast",
+                        inline=False)
+        embed.add_field(name="Event Loop Lag", value=metrics.EVENT_LOOP_LAG.describe(), inline=False)
+        
+        deliveries = ", ".join(f"{labels[0]}: {count:.0f}" for labels, count in metrics.REMINDER_DELIVERIES.items())
+        embed.add_field(name="Reminder Ticks",
+                        value=f"{metrics.REMINDER_TICK.describe()}\n{deliveries or 'No reminders sent yet'}", inline=False)
+        
+        errors = sorted(metrics.LOGGED_ERRORS.items(), key=lambda item: -item[1])[:5]
+        embed.add_field(name="Logged Errors",
+                        value="\n".join(f"• {labels[0]}: {count:.0f}" for labels, count in errors) or 'None',
+                        inline=False)
+        
+        def hit_rate(hits: float, misses: float) -> str:
+            return f"{hits / (hits + misses) * 100:.0f}%" if hits + misses else 'n/a'
+        
+        cache = stats_cache.stats()
+        uptime = timedelta(seconds=int(time.time() - metrics.STARTED_AT.value()))
+        embed.set_footer(text=f"Uptime {uptime} · profile cache hits "
+                              f"{hit_rate(metrics.PROFILE_CACHE.value('hit'), metrics.PROFILE_CACHE.value('miss'))} · "
+                              f"stats cache hits {hit_rate(cache['hits'] + cache['stale_hits'], cache['misses'])}")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        logger.info(f"User {interaction.user} viewed bot metrics")
+    except Exception as e:
+        logger.error(f"Error in bot_metrics command: {e}")
+        await interaction.response.send_message('❌ An error occurred. Please try again.', ephemeral=True)
+
+
 @bot.tree.command(name='set-reminders', description='Configure daily study reminders')
 @app_commands.describe(
     hour='Hour of the day (0-23) to receive reminders',
@@ -381,13 +831,19 @@ async def set_reminders(interaction: discord.Interaction, hour: int, minute: int
             return
         
         # Check if user has set their username
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your LeetCode username first using `/set-username`.', ephemeral=True)
             return
         
-        # Save reminder time
-        db.set_user_reminder(str(interaction.user), hour, minute)
+        # Save reminder time; the guild it was set from decides which shard delivers it
+        await db.set_user_reminder(interaction.user.id, hour, minute, interaction.guild_id)
+        shard_total, own_shards = owned_shards()
+        if interaction.guild_id is None and not runs_every_shard():
+            # The owner is unknown here; the owning process picks it up on its next sync
+            reminder_scheduler.remove(interaction.user.id)
+        elif reminder_shard(interaction.guild_id, interaction.user.id, shard_total) in own_shards:
+            reminder_scheduler.set(interaction.user.id, hour, minute)
         
         time_str = f"{hour:02d}:{minute:02d}"
         embed = discord.Embed(
@@ -411,13 +867,13 @@ async def set_reminders(interaction: discord.Interaction, hour: int, minute: int
 async def view_reminders(interaction: discord.Interaction):
     """Slash command that allows the user to view their reminders"""
     try:
-        reminder = db.get_user_reminder(str(interaction.user))
+        profile = await db.get_user_profile(interaction.user.id)
         
-        if not reminder:
+        if not profile or profile['reminder_hour'] is None:
             await interaction.response.send_message('❌ You have no reminders set. Use `/set-reminders` to configure one!', ephemeral=True)
             return
         
-        hour, minute = reminder
+        hour, minute = profile['reminder_hour'], profile['reminder_minute']
         time_str = f"{hour:02d}:{minute:02d}"
         
         embed = discord.Embed(
@@ -441,13 +897,14 @@ async def view_reminders(interaction: discord.Interaction):
 async def remove_reminders(interaction: discord.Interaction):
     """Slash command that allows the user to remove their reminders"""
     try:
-        reminder = db.get_user_reminder(str(interaction.user))
+        profile = await db.get_user_profile(interaction.user.id)
         
-        if not reminder:
+        if not profile or profile['reminder_hour'] is None:
             await interaction.response.send_message('❌ You have no reminders set.', ephemeral=True)
             return
         
-        db.remove_user_reminder(str(interaction.user))
+        await db.remove_user_reminder(interaction.user.id)
+        reminder_scheduler.remove(interaction.user.id)
         
         embed = discord.Embed(
             title="🔕 Reminders Removed",
@@ -461,54 +918,111 @@ async def remove_reminders(interaction: discord.Interaction):
         logger.error(f"Error in remove_reminders command: {e}")
         await interaction.response.send_message('❌ An error occurred. Please try again.', ephemeral=True)
 
-@tasks.loop(minutes=1)
-async def check_reminders():
-    """Background task to check and send reminders"""
+async def check_reminders(hour: int, minute: int, users_to_remind: list):
+    """Sends the reminders due at the given time to the users owned by this process's shards"""
+    def make_embed(discord_id: int) -> discord.Embed:
+        embed = discord.Embed(
+            title="⏰ Daily Coding Reminder",
+            description="Time to solve some problems and level up your skills!",
+            color=discord.Color.gold()
+        )
+        embed.add_field(
+            name="Suggestions",
+            value="• Try solving 1-2 problems today\n• Review your progress with `/stats`\n• Check your goals and roadmap",
+            inline=False
+        )
+        progress = goal_digest.get(discord_id)
+        if progress:
+            embed.add_field(name="🎯 Goal Pace", value=format_progress(progress), inline=False)
+        embed.set_footer(text="Use /remove-reminders to stop these notifications")
+        return embed
+
+    logging_setup.bind(correlation_id=f"reminder-{hour:02d}{minute:02d}-{int(time.time())}")
+    if not runs_every_shard():
+        try:
+            # The database decides ownership at delivery time, so a reminder that moved
+            # to another process since the last sync is never sent twice. A process that
+            # runs every shard sees every change itself, so its schedule needs no check.
+            users_to_remind = await db.get_due_reminders(hour, minute, *owned_shards())
+        except Exception as e:
+            logger.warning(f"Falling back to the in-memory schedule for {hour:02d}:{minute:02d}: {e}")
     try:
-        now = datetime.now()
-        current_hour = now.hour
-        current_minute = now.minute
-        
-        # Get all users with reminders for this time
-        users_to_remind = db.get_users_with_reminder_time(current_hour, current_minute)
-        
-        for discord_username in users_to_remind:
-            try:
-                # Find the user across all guilds
-                user = None
-                for guild in bot.guilds:
-                    member = discord.utils.get(guild.members, name=discord_username.split('#')[0])
-                    if member and str(member) == discord_username:
-                        user = member
-                        break
-                
-                if user:
-                    embed = discord.Embed(
-                        title="⏰ Daily Coding Reminder",
-                        description="Time to solve some problems and level up your skills!",
-                        color=discord.Color.gold()
-                    )
-                    embed.add_field(
-                        name="Suggestions",
-                        value="• Try solving 1-2 problems today\n• Review your progress with `/stats`\n• Check your goals and roadmap",
-                        inline=False
-                    )
-                    embed.set_footer(text="Use /remove-reminders to stop these notifications")
-                    
-                    try:
-                        await user.send(embed=embed)
-                        logger.info(f"Sent reminder to {discord_username}")
-                    except discord.Forbidden:
-                        logger.warning(f"Could not send DM to {discord_username} - DMs may be disabled")
-            except Exception as e:
-                logger.error(f"Error sending reminder to {discord_username}: {e}")
+        await reminder_dispatcher.dispatch(f"{hour:02d}:{minute:02d}", users_to_remind, make_embed)
     except Exception as e:
         logger.error(f"Error in check_reminders task: {e}")
 
-@check_reminders.before_loop
-async def before_check_reminders():
-    """Wait until the bot is ready before starting the reminder loop"""
+async def claim_legacy_users(members) -> int:
+    """Keys the legacy users among the given members by their Discord ID and returns how many were claimed"""
+    pairs = {str(member): member.id for member in members if str(member) in legacy_usernames}
+    if not pairs:
+        return 0
+    try:
+        claimed = await db.claim_legacy_users(list(pairs.items()))
+        legacy_usernames.difference_update(pairs)
+        return claimed
+    except Exception as e:
+        logger.error(f"Error claiming legacy users: {e}")
+        return 0
+
+async def claim_legacy_members():
+    """Claims the legacy users found among the members of every guild
+
+    This walks the member lists once at startup; users who are not found are
+    claimed the next time they run a command.
+    """
+    if not legacy_usernames:
+        return
+    pending = len(legacy_usernames)
+    claimed = await claim_legacy_users(member for guild in bot.guilds for member in guild.members)
+    logger.info(f"Claimed {claimed} of {pending} users registered before Discord IDs were stored")
+
+async def sync_reminders():
+    """Periodically reloads the owned reminders so changes made through other processes are scheduled"""
+    while True:
+        await asyncio.sleep(REMINDER_SYNC_INTERVAL)
+        try:
+            reminder_scheduler.sync(await db.get_all_reminders(*owned_shards()))
+        except Exception as e:
+            logger.error(f"Error syncing reminders: {e}")
+
+async def refresh_goal_digest_periodically():
+    """Periodically re-evaluates goals, so snapshots written by any process reach this one's digests"""
+    while True:
+        await asyncio.sleep(GOAL_DIGEST_INTERVAL)
+        try:
+            await refresh_goal_digest()
+        except Exception as e:
+            logger.error(f"Error refreshing goal digest: {e}")
+
+async def run_reminders():
+    """Background task that loads this process's reminders and sleeps until each due minute"""
     await bot.wait_until_ready()
+    try:
+        await claim_legacy_members()
+        await refresh_goal_digest()
+        reminder_scheduler.load(await db.get_all_reminders(*owned_shards()))
+        if runs_every_shard():
+            await asyncio.gather(reminder_scheduler.run(check_reminders), refresh_goal_digest_periodically())
+        else:
+            await asyncio.gather(reminder_scheduler.run(check_reminders), sync_reminders(),
+                                 refresh_goal_digest_periodically())
+    except Exception as e:
+        logger.error(f"Error in reminder task: {e}")
+
+
+async def current_solved_count(profile: dict) -> int:
+    """Returns a user's total solved count from the stats cache or a live fetch
+
+    The last recorded snapshot can be hours old, so it is only used when the
+    stats cannot be fetched.
+    """
+    try:
+        results = await stats_cache.get(profile['lc_username'], fetch_stats)
+        if results.get('status') != 'error':
+            return results.get('totalSolved')
+    except StatsError as e:
+        logger.warning(f"Could not fetch current stats of {profile['lc_username']}, using the last snapshot: {e}")
+    return await db.get_latest_solved(profile['discord_id'])
 
 
 @bot.tree.command(name='set-goal', description='Set a personal coding goal')
@@ -526,14 +1040,18 @@ async def set_goal(interaction: discord.Interaction, questions: int, months: int
             return
         
         # Check if user has set their username
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your LeetCode username first using `/set-username`.', ephemeral=True)
             return
         
+        # Capturing the baseline may wait on the stats API, longer than Discord waits for a response
+        await interaction.response.defer()
+
         # Save goal to database
         start_date = datetime.now().strftime('%Y-%m-%d')
-        db.set_user_goal(str(interaction.user), questions, months, start_date)
+        baseline = await current_solved_count(profile)
+        await db.set_user_goal(interaction.user.id, questions, months, start_date, baseline)
         
         questions_per_month = questions / months
         questions_per_week = questions_per_month / 4.33
@@ -555,36 +1073,45 @@ async def set_goal(interaction: discord.Interaction, questions: int, months: int
         )
         embed.set_footer(text="Use /stats to track your progress!")
         
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         logger.info(f"User {interaction.user} set goal: {questions} questions in {months} months")
     except Exception as e:
         logger.error(f"Error in set_goal command: {e}")
-        await interaction.response.send_message('❌ An error occurred while setting your goal. Please try again.', ephemeral=True)
+        try:
+            await interaction.followup.send('❌ An error occurred while setting your goal. Please try again.', ephemeral=True)
+        except:
+            await interaction.response.send_message('❌ An error occurred while setting your goal. Please try again.', ephemeral=True)
 
 
 @bot.tree.command(name='stats', description='View your LeetCode statistics and progress')
 async def get_stats(interaction: discord.Interaction):
     """Slash command that allows the user to check their leetcode statistics"""
     try:
-        username = db.find_user(str(interaction.user))
-        if not username:
+        profile = await db.get_user_profile(interaction.user.id)
+        if not profile or not profile['lc_username']:
             await interaction.response.send_message('Please set your username by using the `/set-username` command.', ephemeral=True)
             return
+        username = profile['lc_username']
 
         await interaction.response.defer()
 
+        fetched_at = None
         try:
-            response = requests.get(f'https://leetcodestats.cyclic.app/{username}', timeout=10)
-            response.raise_for_status()
-            results = response.json()
-        except requests.exceptions.Timeout:
-            await interaction.followup.send('❌ Request timed out. Please try again later.', ephemeral=True)
-            logger.error(f"Timeout fetching stats for {username}")
-            return
-        except requests.exceptions.RequestException as e:
-            await interaction.followup.send('❌ Could not fetch LeetCode stats. Please try again later.', ephemeral=True)
-            logger.error(f"Error fetching stats for {username}: {e}")
-            return
+            results = await stats_cache.get(username, fetch_stats)
+            # Read before any other await, while the cache entry still holds these results
+            cached_at = stats_cache.fetched_at(username)
+        except StatsError as e:
+            # Serve the last stats that were fetched successfully, marked with their age
+            fallback = await db.get_last_good_stats(username)
+            if fallback is None:
+                if isinstance(e, StatsTimeoutError):
+                    await interaction.followup.send('❌ Request timed out. Please try again later.', ephemeral=True)
+                else:
+                    await interaction.followup.send('❌ Could not fetch LeetCode stats. Please try again later.', ephemeral=True)
+                logger.error(f"Error fetching stats for {username}: {e}")
+                return
+            results, fetched_at = fallback
+            logger.warning(f"Serving stored stats for {username} from {fetched_at}: {e}")
 
         if results.get('status') == 'error':
             await interaction.followup.send(f'❌ Username **{username}** was not found on LeetCode.', ephemeral=True)
@@ -657,17 +1184,29 @@ async def get_stats(interaction: discord.Interaction):
         )
         
         # Check if user has a goal
-        goal = db.get_user_goal(str(interaction.user))
-        if goal:
-            goal_questions, goal_months, start_date = goal
+        if profile['goal_questions'] is not None:
+            goal_questions, goal_months = profile['goal_questions'], profile['goal_duration']
             embed.add_field(
                 name="🎯 Your Goal",
                 value=f"Solve {goal_questions} questions in {goal_months} month{'s' if goal_months > 1 else ''}",
                 inline=False
             )
+            
+            baseline = profile['goal_baseline_solved']
+            if baseline is None:
+                baseline = await db.get_goal_baseline(profile['discord_id'])
+            progress = goal_progress(goal_questions, goal_months, profile['goal_start_date'], baseline, total_solved)
+            if progress:
+                embed.add_field(name="📈 Goal Pace", value=format_progress(progress), inline=False)
         
+        if fetched_at is not None:
+            embed.set_footer(text=f"⚠️ LeetCode is not responding, showing stats from "
+                                  f"{format_age(time.time() - fetched_at)} ago")
+
         await interaction.followup.send(embed=embed)
-        logger.info(f"Fetched stats for user {interaction.user} (LeetCode: {username})")
+        if fetched_at is None and cached_at is not None:
+            await record_stats_snapshot(profile['discord_id'], results, cached_at)
+        logger.info(f"Fetched stats for user {interaction.user} (LeetCode: {username}), cache: {stats_cache.stats()}")
     except Exception as e:
         logger.error(f"Error in get_stats command: {e}")
         try:
@@ -676,5 +1215,7 @@ async def get_stats(interaction: discord.Interaction):
             await interaction.response.send_message('❌ An error occurred while fetching stats. Please try again.', ephemeral=True)
 
 
-bot.run(getenv("BOT_TOKEN"))
-db.kill()
+if __name__ == '__main__':
+    # Logging is already configured; stop discord.py from adding its own root handler
+    bot.run(getenv("BOT_TOKEN"), log_handler=None)
+    db.kill()
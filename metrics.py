@@ -0,0 +1,261 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from os import getenv
+import asyncio
+import logging
+import time
+from aiohttp import web
+
+logger = logging.getLogger('LeetGo')
+
+# Latency buckets in seconds, from a cached lookup up to a stats request timing out
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by label values"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def items(self) -> list:
+        """Returns (label_values, value) pairs"""
+        return list(self._values.items())
+
+    def render(self) -> list:
+        return [f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+                for label_values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type = 'gauge'
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+
+class Histogram:
+    """Bucketed distribution of observations, split by label values
+
+    Buckets are cumulative in the exposition format, as Prometheus expects, and
+    quantiles are estimated by interpolating inside the bucket that holds them.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observes the duration of the block, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def quantile(self, q: float, *label_values) -> float:
+        """Estimates the q-quantile of a series in seconds, or None if it is empty"""
+        series = self._series.get(label_values)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for index, bucket_count in enumerate(series[0]):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def label_values(self) -> list:
+        return list(self._series)
+
+    def describe(self, *label_values) -> str:
+        """Summarizes a series as call count and p50/p95/p99 in milliseconds"""
+        count = self.count(*label_values)
+        if not count:
+            return 'No data yet'
+        p50, p95, p99 = (self.quantile(q, *label_values) * 1000 for q in (0.5, 0.95, 0.99))
+        return f'{count} × p50 {p50:.1f} · p95 {p95:.1f} · p99 {p99:.1f} ms'
+
+    def render(self) -> list:
+        lines = []
+        for label_values, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, label_values)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+COMMAND_LATENCY = registry.histogram('leetgo_command_seconds', 'Slash command handling time', ('command',))
+COMMAND_ERRORS = registry.counter('leetgo_command_errors_total', 'Slash commands that raised out of their handler',
+                                  ('command',))
+LOGGED_ERRORS = registry.counter('leetgo_logged_errors_total', 'Errors logged by the bot, by the function that logged them',
+                                 ('function',))
+DB_LATENCY = registry.histogram('leetgo_db_seconds', 'Database call time including queueing', ('method',))
+DB_ERRORS = registry.counter('leetgo_db_errors_total', 'Database calls that raised', ('method',))
+PROFILE_CACHE = registry.counter('leetgo_profile_cache_total', 'User profile cache lookups', ('result',))
+STATS_LATENCY = registry.histogram('leetgo_stats_request_seconds', 'LeetCode stats API request time', ('outcome',))
+CIRCUIT_STATE = registry.gauge('leetgo_circuit_state', 'Circuit breaker state: 0 closed, 1 half-open, 2 open', ('name',))
+CIRCUIT_REJECTIONS = registry.counter('leetgo_circuit_rejections_total', 'Calls rejected by an open circuit', ('name',))
+STATS_TIMEOUT = registry.gauge('leetgo_stats_timeout_seconds', 'Current adaptive stats API request timeout')
+SINGLEFLIGHT_CALLS = registry.counter('leetgo_singleflight_calls_total',
+                                     'Calls that started a shared request (leader) or joined one (coalesced)',
+                                     ('group', 'role'))
+EVENT_LOOP_LAG = registry.histogram('leetgo_event_loop_lag_seconds', 'How late the event loop woke a sleeping task')
+REMINDER_TICK = registry.histogram('leetgo_reminder_tick_seconds', 'Time to deliver one reminder slot')
+REMINDER_DELIVERIES = registry.counter('leetgo_reminder_deliveries_total', 'Reminder DMs by outcome', ('outcome',))
+STARTED_AT = registry.gauge('leetgo_start_time_seconds', 'Unix time the process started')
+STARTED_AT.set(time.time())
+
+
+class ErrorLogCounter(logging.Handler):
+    """Counts error log records by the function that emitted them
+
+    Commands catch their own exceptions and reply with an error message, so
+    their failures only surface as log records; counting those records makes
+    them visible next to the latency histograms.
+    """
+
+    def __init__(self, counter: Counter = LOGGED_ERRORS):
+        super().__init__(level=logging.ERROR)
+        self.counter = counter
+
+    def emit(self, record: logging.LogRecord):
+        self.counter.inc(record.funcName)
+
+
+async def monitor_event_loop(interval: float = None):
+    """Measures how late the loop wakes up from a sleep, forever
+
+    A healthy loop overshoots by well under a millisecond; anything more means
+    a callback blocked the loop for that long.
+    """
+    interval = interval or float(getenv('METRICS_LOOP_INTERVAL', '0.5'))
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+class MetricsServer:
+    """Serves the registry on ``/metrics`` in the Prometheus text format"""
+
+    def __init__(self, metrics: MetricsRegistry = registry, host: str = None, port: int = None):
+        self.metrics = metrics
+        self.host = host or getenv('METRICS_HOST', '127.0.0.1')
+        self.port = port if port is not None else int(getenv('METRICS_PORT', '9108'))
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self):
+        """Starts listening unless METRICS_PORT is 0"""
+        if self.port == 0 or self._runner is not None:
+            return
+        try:
+            app = web.Application()
+            app.router.add_get('/metrics', self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        except Exception as e:
+            logger.error(f"Error starting metrics server: {e}")
+            await self.stop()
+
+    async def stop(self):
+        try:
+            if self._runner is not None:
+                await self._runner.cleanup()
+        except Exception as e:
+            logger.error(f"Error stopping metrics server: {e}")
+        finally:
+            self._runner = None
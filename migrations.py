@@ -0,0 +1,266 @@
+from datetime import date, datetime, timedelta
+from os import getenv
+import logging
+
+logger = logging.getLogger('LeetGo')
+
+# Applied to every connection when it is opened. WAL lets readers run while the
+# writer commits; synchronous=NORMAL is durable across application crashes and
+# only risks the last commits on power loss when combined with WAL.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': getenv('DB_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': -int(getenv('DB_CACHE_SIZE_KB', '16384')),
+    'mmap_size': int(getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'temp_store': 'MEMORY',
+}
+
+
+def week_start(taken_at: int) -> str:
+    """Returns the ISO date of the Monday starting the local week of a unix timestamp"""
+    day = date.fromtimestamp(taken_at)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _backfill_leaderboard(connection):
+    """Seeds leaderboard_stats from the snapshots recorded so far"""
+    latest = connection.execute('''SELECT s.user_id, s.taken_at, s.easy_solved + s.medium_solved + s.hard_solved,
+                                          s.hard_solved
+                                   FROM stats_snapshots s
+                                   JOIN (SELECT user_id, MAX(taken_at) AS taken_at FROM stats_snapshots
+                                         GROUP BY user_id) m
+                                   ON m.user_id = s.user_id AND m.taken_at = s.taken_at''').fetchall()
+    rows = []
+    for user_id, taken_at, total_solved, hard_solved in latest:
+        start = week_start(taken_at)
+        start_ts = datetime.fromisoformat(start).timestamp()
+        baseline = connection.execute('''SELECT MIN(easy_solved + medium_solved + hard_solved)
+                                         FROM stats_snapshots WHERE user_id=? AND taken_at>=?''',
+                                      (user_id, start_ts)).fetchone()[0]
+        rows.append((user_id, total_solved, hard_solved, start, baseline, taken_at))
+    connection.executemany('''INSERT OR REPLACE INTO leaderboard_stats
+                              (user_id, total_solved, hard_solved, week_start, week_baseline, updated_at)
+                              VALUES (?, ?, ?, ?, ?, ?)''', rows)
+
+
+# Columns of a user other than their keys, as of migration 12
+USER_COLUMNS = ('discord_username, cohort_id, lc_username, roadmap, goal_questions, goal_duration, goal_start_date, '
+                'goal_baseline_solved, reminder_hour, reminder_minute, home_guild_id, username_updated_at')
+
+
+def _key_users_by_discord_id(connection):
+    """Rebuilds users with the Discord user ID as its integer primary key
+
+    Snapshots and leaderboard rows are remapped from the old user_id to the
+    Discord ID, keeping the column name user_id. Users who never recorded a
+    Discord ID cannot be keyed yet: they move to legacy_users with their old
+    user_id and are claimed, together with their snapshots, once their owner is
+    seen again (Database.claim_legacy_users).
+    """
+    connection.execute('''CREATE TABLE users_by_id(
+                              discord_id INTEGER PRIMARY KEY NOT NULL,
+                              discord_username TEXT,
+                              cohort_id INTEGER,
+                              lc_username TEXT,
+                              roadmap TEXT,
+                              goal_questions INTEGER,
+                              goal_duration INTEGER,
+                              goal_start_date TEXT,
+                              goal_baseline_solved INTEGER,
+                              reminder_hour INTEGER,
+                              reminder_minute INTEGER,
+                              home_guild_id INTEGER,
+                              username_updated_at INTEGER,
+                              FOREIGN KEY(cohort_id) REFERENCES cohorts(cohort_id))''')
+    connection.execute(f'''INSERT INTO users_by_id (discord_id, {USER_COLUMNS})
+                          SELECT discord_id, {USER_COLUMNS} FROM users WHERE discord_id IS NOT NULL''')
+    connection.execute('''CREATE TABLE IF NOT EXISTS legacy_users(
+                              discord_username TEXT PRIMARY KEY NOT NULL,
+                              user_id INTEGER NOT NULL,
+                              cohort_id INTEGER,
+                              lc_username TEXT,
+                              roadmap TEXT,
+                              goal_questions INTEGER,
+                              goal_duration INTEGER,
+                              goal_start_date TEXT,
+                              goal_baseline_solved INTEGER,
+                              reminder_hour INTEGER,
+                              reminder_minute INTEGER,
+                              home_guild_id INTEGER,
+                              username_updated_at INTEGER)''')
+    connection.execute(f'''INSERT INTO legacy_users (user_id, {USER_COLUMNS})
+                          SELECT user_id, {USER_COLUMNS} FROM users WHERE discord_id IS NULL''')
+
+    # Both tables are rebuilt, rather than updated in place, so their foreign keys follow the new key
+    connection.execute('''CREATE TEMP TABLE user_keys AS
+                          SELECT user_id, discord_id FROM users WHERE discord_id IS NOT NULL''')
+    connection.execute('''CREATE TABLE stats_snapshots_by_id(
+                              snapshot_id INTEGER PRIMARY KEY,
+                              user_id INTEGER NOT NULL,
+                              taken_at INTEGER NOT NULL,
+                              easy_solved INTEGER NOT NULL,
+                              medium_solved INTEGER NOT NULL,
+                              hard_solved INTEGER NOT NULL,
+                              ranking INTEGER,
+                              FOREIGN KEY(user_id) REFERENCES users(discord_id))''')
+    connection.execute('''INSERT INTO stats_snapshots_by_id
+                          SELECT s.snapshot_id, COALESCE(k.discord_id, s.user_id), s.taken_at, s.easy_solved,
+                                 s.medium_solved, s.hard_solved, s.ranking
+                          FROM stats_snapshots s LEFT JOIN user_keys k ON k.user_id = s.user_id''')
+    connection.execute('''CREATE TABLE leaderboard_stats_by_id(
+                              user_id INTEGER PRIMARY KEY,
+                              total_solved INTEGER NOT NULL,
+                              hard_solved INTEGER NOT NULL,
+                              week_start TEXT NOT NULL,
+                              week_baseline INTEGER NOT NULL,
+                              updated_at INTEGER NOT NULL,
+                              FOREIGN KEY(user_id) REFERENCES users(discord_id))''')
+    connection.execute('''INSERT INTO leaderboard_stats_by_id
+                          SELECT COALESCE(k.discord_id, l.user_id), l.total_solved, l.hard_solved, l.week_start,
+                                 l.week_baseline, l.updated_at
+                          FROM leaderboard_stats l LEFT JOIN user_keys k ON k.user_id = l.user_id''')
+    connection.execute('DROP TABLE user_keys')
+    connection.execute('DROP TABLE stats_snapshots')
+    connection.execute('DROP TABLE leaderboard_stats')
+    connection.execute('ALTER TABLE stats_snapshots_by_id RENAME TO stats_snapshots')
+    connection.execute('ALTER TABLE leaderboard_stats_by_id RENAME TO leaderboard_stats')
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_user_time ON stats_snapshots(user_id, taken_at)')
+
+    connection.execute('DROP TABLE users')
+    connection.execute('ALTER TABLE users_by_id RENAME TO users')
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_users_reminder_time ON users(reminder_hour, reminder_minute)')
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_users_cohort ON users(cohort_id)')
+
+
+# Ordered schema migrations as (version, description, statements). A statement
+# is either SQL or a callable receiving the connection, for changes that cannot
+# be expressed as plain SQL. Released migrations must never be edited; add a
+# new one instead.
+MIGRATIONS = [
+    (1, 'Create cohorts and users tables', [
+        'CREATE TABLE IF NOT EXISTS cohorts(cohort_id INTEGER PRIMARY KEY, name TEXT)',
+        '''CREATE TABLE IF NOT EXISTS users(
+                  user_id INTEGER PRIMARY KEY NOT NULL,
+                  cohort_id INTEGER,
+                  discord_username TEXT NOT NULL UNIQUE,
+                  lc_username TEXT,
+                  roadmap TEXT,
+                  goal_questions INTEGER,
+                  goal_duration INTEGER,
+                  goal_start_date TEXT,
+                  reminder_hour INTEGER,
+                  reminder_minute INTEGER,
+                  FOREIGN KEY(cohort_id) REFERENCES cohorts(cohort_id))''',
+    ]),
+    (2, 'Index reminder times and cohort membership', [
+        'CREATE INDEX IF NOT EXISTS idx_users_reminder_time ON users(reminder_hour, reminder_minute)',
+        'CREATE INDEX IF NOT EXISTS idx_users_cohort ON users(cohort_id)',
+    ]),
+    (3, 'Store Discord user IDs', [
+        'ALTER TABLE users ADD COLUMN discord_id INTEGER',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_discord_id ON users(discord_id)',
+    ]),
+    (4, 'Add LeetCode stats snapshots', [
+        '''CREATE TABLE IF NOT EXISTS stats_snapshots(
+                  snapshot_id INTEGER PRIMARY KEY,
+                  user_id INTEGER NOT NULL,
+                  taken_at INTEGER NOT NULL,
+                  easy_solved INTEGER NOT NULL,
+                  medium_solved INTEGER NOT NULL,
+                  hard_solved INTEGER NOT NULL,
+                  ranking INTEGER,
+                  FOREIGN KEY(user_id) REFERENCES users(user_id))''',
+        'CREATE INDEX IF NOT EXISTS idx_snapshots_user_time ON stats_snapshots(user_id, taken_at)',
+    ]),
+    (5, 'Add incrementally maintained leaderboard aggregates', [
+        '''CREATE TABLE IF NOT EXISTS leaderboard_stats(
+                  user_id INTEGER PRIMARY KEY,
+                  total_solved INTEGER NOT NULL,
+                  hard_solved INTEGER NOT NULL,
+                  week_start TEXT NOT NULL,
+                  week_baseline INTEGER NOT NULL,
+                  updated_at INTEGER NOT NULL,
+                  FOREIGN KEY(user_id) REFERENCES users(user_id))''',
+        _backfill_leaderboard,
+    ]),
+    (6, 'Store the solved count at goal start', [
+        'ALTER TABLE users ADD COLUMN goal_baseline_solved INTEGER',
+    ]),
+    (7, 'Partition cohorts by guild', [
+        'ALTER TABLE cohorts ADD COLUMN guild_id INTEGER',
+        'ALTER TABLE cohorts ADD COLUMN channel_id INTEGER',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_cohorts_guild_channel ON cohorts(guild_id, channel_id)',
+        'CREATE INDEX IF NOT EXISTS idx_cohorts_guild_name ON cohorts(guild_id, name)',
+    ]),
+    (8, 'Store the guild that owns each user\'s reminders', [
+        'ALTER TABLE users ADD COLUMN home_guild_id INTEGER',
+        '''UPDATE users SET home_guild_id = (SELECT guild_id FROM cohorts WHERE cohorts.cohort_id = users.cohort_id)
+           WHERE cohort_id IS NOT NULL''',
+    ]),
+    (9, 'Add persisted bot state', [
+        '''CREATE TABLE IF NOT EXISTS bot_state(
+                  key TEXT PRIMARY KEY,
+                  value TEXT NOT NULL,
+                  updated_at INTEGER NOT NULL)''',
+    ]),
+    (10, 'Keep the last successfully fetched stats of each LeetCode user', [
+        '''CREATE TABLE IF NOT EXISTS last_good_stats(
+                  lc_username TEXT PRIMARY KEY COLLATE NOCASE,
+                  payload TEXT NOT NULL,
+                  fetched_at INTEGER NOT NULL)''',
+    ]),
+    (11, 'Record when a registered user last changed their LeetCode username', [
+        'ALTER TABLE users ADD COLUMN username_updated_at INTEGER',
+    ]),
+    (12, 'Key users by their Discord user ID', [
+        _key_users_by_discord_id,
+    ]),
+]
+
+
+def configure_connection(connection):
+    """Applies the performance pragmas to a freshly opened connection"""
+    for name, value in PRAGMAS.items():
+        connection.execute(f'PRAGMA {name}={value}')
+
+
+def get_schema_version(connection) -> int:
+    """Returns the highest applied migration version, 0 for a new database"""
+    connection.execute('''CREATE TABLE IF NOT EXISTS schema_version(
+                          version INTEGER PRIMARY KEY,
+                          description TEXT NOT NULL,
+                          applied_at TEXT NOT NULL)''')
+    row = connection.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(connection) -> int:
+    """Brings the database up to the latest schema version
+
+    Each pending migration runs in its own transaction together with its
+    schema_version row, so an interrupted upgrade resumes where it stopped.
+
+    Returns:
+        The schema version after migrating
+    """
+    current = get_schema_version(connection)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            connection.execute('BEGIN')
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(statement)
+            connection.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                               (version, description, datetime.now().isoformat(timespec='seconds')))
+            connection.commit()
+            current = version
+            logger.info(f"Applied database migration {version}: {description}")
+        except Exception as e:
+            connection.rollback()
+            logger.error(f"Error applying database migration {version}: {e}")
+            raise
+    return current
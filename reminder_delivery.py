@@ -0,0 +1,164 @@
+from collections import Counter, OrderedDict
+from os import getenv
+import asyncio
+import logging
+import random
+import time
+import discord
+import metrics
+
+logger = logging.getLogger('LeetGo')
+
+
+class RecipientResolver:
+    """Resolves reminder recipients by Discord user ID
+
+    Users already in the client's cache are returned directly. Anyone else is
+    fetched once over the API and kept in a bounded LRU cache, so resolving a
+    recipient costs the same no matter how many guilds or members the bot sees.
+    """
+
+    def __init__(self, client: discord.Client, max_size: int = 10000):
+        self.client = client
+        self.max_size = max_size
+        self._fetched = OrderedDict()
+
+    async def resolve(self, discord_id: int):
+        """Returns the discord.User for an ID, or None if the account no longer exists"""
+        user = self.client.get_user(discord_id)
+        if user is not None:
+            return user
+
+        if discord_id in self._fetched:
+            self._fetched.move_to_end(discord_id)
+            return self._fetched[discord_id]
+
+        try:
+            user = await self.client.fetch_user(discord_id)
+        except discord.NotFound:
+            user = None
+        self._fetched[discord_id] = user
+        while len(self._fetched) > self.max_size:
+            self._fetched.popitem(last=False)
+        return user
+
+
+class RateLimiter:
+    """Token bucket shared by every reminder worker
+
+    Keeps the bot below Discord's global request limit so bursts of reminders
+    do not trip 429 responses that would stall every other command.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        # Room for at least one DM that also has to open its channel
+        self.capacity = burst or max(2, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 1):
+        """Waits until ``tokens`` requests may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class ReminderDispatcher:
+    """Delivers reminder DMs through a bounded pool of concurrent workers
+
+    Every send passes through a global token bucket. Sends that fail with a 429
+    or a 5xx are retried with exponential backoff and jitter. Each tick produces
+    a report of delivery outcomes and throughput, and outcomes are also
+    accumulated in ``totals``.
+    """
+
+    def __init__(self, resolver: RecipientResolver, concurrency: int = None, rate: float = None,
+                 max_retries: int = None):
+        """Reads the delivery limits from the environment unless they are given explicitly
+
+        Args:
+            resolver: Resolves Discord user IDs to users
+            concurrency: Number of workers sending DMs at the same time
+            rate: Maximum Discord API requests per second spent on reminders
+            max_retries: Attempts after the first one for rate-limited or failed sends
+        """
+        self.resolver = resolver
+        self.concurrency = concurrency or int(getenv('REMINDER_CONCURRENCY', '20'))
+        self.max_retries = max_retries if max_retries is not None else int(getenv('REMINDER_MAX_RETRIES', '3'))
+        self.limiter = RateLimiter(rate or float(getenv('REMINDER_RATE_PER_SECOND', '40')))
+        self.totals = Counter()
+        self.last_report = None
+
+    async def dispatch(self, label: str, user_ids: list, make_embed) -> dict:
+        """Sends ``make_embed(discord_id)`` to every user and returns the tick report"""
+        started = time.monotonic()
+        outcomes = Counter()
+        queue = asyncio.Queue()
+        for discord_id in user_ids:
+            queue.put_nowait(discord_id)
+
+        async def worker():
+            while True:
+                try:
+                    discord_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                outcomes[await self._deliver(discord_id, make_embed(discord_id))] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(user_ids)))))
+
+        elapsed = time.monotonic() - started
+        self.totals.update(outcomes)
+        metrics.REMINDER_TICK.observe(elapsed)
+        for outcome, count in outcomes.items():
+            metrics.REMINDER_DELIVERIES.inc(outcome, amount=count)
+        self.last_report = {
+            'label': label,
+            'users': len(user_ids),
+            'outcomes': dict(outcomes),
+            'seconds': elapsed,
+            'per_second': len(user_ids) / elapsed if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Reminder tick {label}: {len(user_ids)} users in {elapsed:.2f}s "
+                    f"({self.last_report['per_second']:.1f}/s), outcomes {dict(outcomes)}")
+        return self.last_report
+
+    async def _deliver(self, discord_id: int, embed: discord.Embed) -> str:
+        """Sends one reminder and returns its outcome"""
+        try:
+            user = await self.resolver.resolve(discord_id)
+        except Exception as e:
+            logger.error(f"Error resolving reminder recipient {discord_id}: {e}")
+            return 'failed'
+        if user is None:
+            logger.warning(f"Reminder recipient {discord_id} no longer exists")
+            return 'not_found'
+
+        for attempt in range(self.max_retries + 1):
+            # Opening the DM channel is a separate request the first time
+            await self.limiter.acquire(2 if user.dm_channel is None else 1)
+            try:
+                await user.send(embed=embed)
+                return 'delivered' if attempt == 0 else 'delivered_after_retry'
+            except discord.Forbidden:
+                logger.warning(f"Could not send DM to {user} ({discord_id}) - DMs may be disabled")
+                return 'forbidden'
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    logger.error(f"Error sending reminder to {user} ({discord_id}): {e}")
+                    return 'failed'
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on reminder to {user} ({discord_id}) after {attempt + 1} attempts: {e}")
+                    return 'failed'
+                await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+            except Exception as e:
+                logger.error(f"Error sending reminder to {user} ({discord_id}): {e}")
+                return 'failed'
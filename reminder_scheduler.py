@@ -0,0 +1,149 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from os import getenv
+import asyncio
+import logging
+
+logger = logging.getLogger('LeetGo')
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class ReminderScheduler:
+    """In-memory timing wheel of daily reminders with one slot per minute of the day
+
+    The wheel is loaded once at startup and then kept in sync by the reminder
+    commands, so steady-state scheduling never touches the database. A sorted
+    list of occupied slots lets the runner sleep straight to the next minute
+    that has reminders instead of waking up every minute.
+    """
+
+    def __init__(self, max_catch_up: float = None):
+        """Reads the catch-up bound from the environment unless it is given explicitly
+
+        Args:
+            max_catch_up: Minutes back a late wake-up still delivers the slots it missed
+        """
+        if max_catch_up is None:
+            max_catch_up = float(getenv('REMINDER_CATCH_UP_MINUTES', '15'))
+        self.max_catch_up = timedelta(minutes=max_catch_up)
+        self._slots = [set() for _ in range(MINUTES_PER_DAY)]
+        self._slot_of = {}
+        self._occupied = []
+        self._changed = asyncio.Event()
+        # Earliest minute that has not been considered for firing yet
+        self._cursor = None
+        self._dispatches = set()
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def load(self, reminders: list):
+        """Adds (user, hour, minute) rows, typically read once at startup"""
+        for user, hour, minute in reminders:
+            self.set(user, hour, minute)
+        logger.info(f"Loaded {len(self)} reminders into the scheduler")
+
+    def set(self, user, hour: int, minute: int):
+        """Schedules or moves a user's daily reminder"""
+        self.remove(user)
+        slot = hour * 60 + minute
+        if not self._slots[slot]:
+            insort(self._occupied, slot)
+        self._slots[slot].add(user)
+        self._slot_of[user] = slot
+        self._changed.set()
+
+    def remove(self, user):
+        """Unschedules a user's reminder if there is one"""
+        slot = self._slot_of.pop(user, None)
+        if slot is None:
+            return
+        self._slots[slot].discard(user)
+        if not self._slots[slot]:
+            self._occupied.pop(bisect_left(self._occupied, slot))
+        self._changed.set()
+
+    def sync(self, reminders: list):
+        """Makes the schedule match (user, hour, minute) rows, touching only what changed"""
+        wanted = {user: hour * 60 + minute for user, hour, minute in reminders}
+        for user in [user for user in self._slot_of if user not in wanted]:
+            self.remove(user)
+        for user, slot in wanted.items():
+            if self._slot_of.get(user) != slot:
+                self.set(user, *divmod(slot, 60))
+
+    def due(self, hour: int, minute: int) -> list:
+        """Returns the users whose reminder is at the given time"""
+        return list(self._slots[hour * 60 + minute])
+
+    def next_fire_time(self, now: datetime):
+        """Returns the start of the next occupied minute that has not fired yet, or None
+
+        The search starts right after the last fired minute, so slots passed
+        during a late wake-up are returned (in the past) until they are caught
+        up, going back at most ``max_catch_up``.
+        """
+        if not self._occupied:
+            return None
+        candidate = now.replace(second=0, microsecond=0)
+        if self._cursor is not None:
+            candidate = max(self._cursor, candidate - self.max_catch_up)
+        slot = candidate.hour * 60 + candidate.minute
+        day = candidate.replace(hour=0, minute=0)
+        index = bisect_left(self._occupied, slot)
+        if index == len(self._occupied):
+            return day + timedelta(days=1, minutes=self._occupied[0])
+        return day + timedelta(minutes=self._occupied[index])
+
+    async def run(self, dispatch):
+        """Sleeps until each occupied minute and calls ``await dispatch(hour, minute, users)``
+
+        Any change to the schedule wakes the runner so it can re-plan. Because
+        the runner targets wall-clock minutes rather than counting ticks, a late
+        wake-up still delivers the slot it was waiting for, then every occupied
+        minute it overslept (up to ``max_catch_up``) instead of skipping them.
+        Each slot is dispatched in its own task, so a large slot that takes more
+        than a minute to deliver never delays the next one.
+        """
+        while True:
+            self._changed.clear()
+            target = self.next_fire_time(datetime.now())
+            if target is None:
+                await self._changed.wait()
+                self._skip_past()
+                continue
+
+            delay = (target - datetime.now()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                    # Nothing was overslept, so reminders just added for an earlier minute stay for tomorrow
+                    self._skip_past()
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            if datetime.now() < target:
+                # Woken early, e.g. by a clock adjustment
+                continue
+
+            self._cursor = target + timedelta(minutes=1)
+            users = self.due(target.hour, target.minute)
+            if not users:
+                continue
+            task = asyncio.create_task(self._dispatch(dispatch, target, users))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    def _skip_past(self):
+        """Moves the cursor up to the current minute after waking on time"""
+        now = datetime.now().replace(second=0, microsecond=0)
+        if self._cursor is None or self._cursor < now:
+            self._cursor = now
+
+    async def _dispatch(self, dispatch, target: datetime, users: list):
+        """Runs one slot's dispatch and logs any failure"""
+        try:
+            await dispatch(target.hour, target.minute, users)
+        except Exception as e:
+            logger.error(f"Error dispatching reminders for {target:%H:%M}: {e}")
@@ -0,0 +1,37 @@
+from os import getenv
+
+
+def shard_config() -> tuple:
+    """Reads SHARD_COUNT and SHARD_IDS from the environment
+
+    Returns:
+        (shard_count, shard_ids); both are None to let Discord pick the shard
+        count and run every shard in this process
+
+    Raises:
+        ValueError: SHARD_IDS is set without SHARD_COUNT, or names a shard outside it
+    """
+    shard_count = int(getenv('SHARD_COUNT', '0')) or None
+    raw_ids = getenv('SHARD_IDS', '').strip()
+    shard_ids = [int(shard_id) for shard_id in raw_ids.split(',') if shard_id.strip()] if raw_ids else None
+    if shard_ids is not None:
+        if shard_count is None:
+            raise ValueError("SHARD_IDS requires SHARD_COUNT to be set")
+        if any(not 0 <= shard_id < shard_count for shard_id in shard_ids):
+            raise ValueError(f"SHARD_IDS {shard_ids} must be between 0 and SHARD_COUNT - 1 ({shard_count - 1})")
+    return shard_count, shard_ids
+
+
+def shard_of(snowflake: int, shard_count: int) -> int:
+    """Returns the shard that owns a Discord ID, using Discord's own guild-to-shard formula"""
+    return (snowflake >> 22) % shard_count
+
+
+def reminder_shard(home_guild_id: int, discord_id: int, shard_count: int) -> int:
+    """Returns the shard that delivers a user's reminders
+
+    It is the shard of the guild the user last set their reminder from, or the
+    shard of their own ID if that is unknown. Database.REMINDER_SHARD mirrors
+    this in SQL.
+    """
+    return shard_of(home_guild_id or discord_id, shard_count)
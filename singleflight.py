@@ -0,0 +1,74 @@
+import asyncio
+import metrics
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call
+
+    The first caller for a key starts the call. Anyone asking for the same key
+    before it finishes awaits that call and gets the same result or exception.
+    The call runs in its own task, so a caller that gives up (for example a
+    timed-out interaction) does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key, fn, *args):
+        """Returns ``await fn(*args)``, sharing the call with concurrent callers of ``key``"""
+        task = self._in_flight.get(key)
+        if task is None:
+            metrics.SINGLEFLIGHT_CALLS.inc(self.name, 'leader')
+            task = asyncio.ensure_future(fn(*args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+        else:
+            metrics.SINGLEFLIGHT_CALLS.inc(self.name, 'coalesced')
+        return await asyncio.shield(task)
+
+    async def do_many(self, items: dict, fn, *args) -> dict:
+        """Returns ``{key: result}`` for a batch of keys, sharing each one with concurrent callers
+
+        ``items`` maps every key to the item ``fn`` is called with. Keys already
+        in flight join those calls; the others are answered together by one
+        ``await fn(list_of_items, *args)`` returning results keyed by item.
+        Meanwhile each of those keys is in flight, so a concurrent ``do`` for
+        it joins the batch and gets None if the batch left its item out.
+        Keys whose call failed are left out; an exception of the batch call
+        itself is raised.
+        """
+        joined = {key: self._in_flight[key] for key in items if key in self._in_flight}
+        leading = {key: item for key, item in items.items() if key not in joined}
+        results = {}
+        if leading:
+            batch = asyncio.ensure_future(fn(list(leading.values()), *args))
+            for key, item in leading.items():
+                metrics.SINGLEFLIGHT_CALLS.inc(self.name, 'leader')
+                task = asyncio.ensure_future(self._pick(batch, item))
+                self._in_flight[key] = task
+                task.add_done_callback(lambda finished, key=key: self._forget(key, finished))
+            found = await asyncio.shield(batch)
+            results.update({key: found[item] for key, item in leading.items() if item in found})
+        for key, task in joined.items():
+            metrics.SINGLEFLIGHT_CALLS.inc(self.name, 'coalesced')
+            try:
+                results[key] = await asyncio.shield(task)
+            except Exception:
+                continue
+        return results
+
+    @staticmethod
+    async def _pick(batch: asyncio.Future, item):
+        """Returns one item's result of a batch call, or None if the batch left it out"""
+        return (await batch).get(item)
+
+    def _forget(self, key, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
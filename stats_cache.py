@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from os import getenv
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('LeetGo')
+
+
+class StatsCache:
+    """Bounded in-process cache of LeetCode profile stats
+
+    Entries younger than ``ttl`` are served directly. Entries that are older but
+    still within ``stale_ttl`` are served immediately while a single background
+    task refreshes them (stale-while-revalidate). Anything older is a miss and
+    is fetched inline. The least recently used entry is evicted once the cache
+    holds ``max_size`` usernames.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None, stale_ttl: float = None):
+        """Reads the cache limits from the environment unless they are given explicitly
+
+        Args:
+            max_size: Maximum number of usernames kept in memory
+            ttl: Seconds an entry is considered fresh
+            stale_ttl: Extra seconds a stale entry may still be served while it refreshes
+        """
+        self.max_size = max_size or int(getenv('STATS_CACHE_SIZE', '1024'))
+        self.ttl = ttl if ttl is not None else float(getenv('STATS_CACHE_TTL', '300'))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(getenv('STATS_CACHE_STALE_TTL', '3600'))
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(username: str) -> str:
+        """LeetCode usernames are case-insensitive"""
+        return username.lower()
+
+    async def get(self, username: str, fetcher) -> dict:
+        """Returns the stats of a user, calling ``await fetcher(username)`` when needed"""
+        key = self._key(username)
+        entry = self._entries.get(key)
+        if entry is not None:
+            results, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return results
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._schedule_refresh(key, username, fetcher)
+                return results
+
+        self.misses += 1
+        results = await fetcher(username)
+        self.put(username, results)
+        return results
+
+    def put(self, username: str, results: dict):
+        """Stores freshly fetched stats, skipping upstream "user not found" answers"""
+        if not isinstance(results, dict) or results.get('status') == 'error':
+            return
+        key = self._key(username)
+        self._entries[key] = (results, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def fetched_at(self, username: str) -> float:
+        """Returns the unix time the cached stats of a user were fetched, or None if none are cached"""
+        entry = self._entries.get(self._key(username))
+        if entry is None:
+            return None
+        return time.time() - (time.monotonic() - entry[1])
+
+    def _schedule_refresh(self, key: str, username: str, fetcher):
+        """Starts at most one background refresh per username"""
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(username, fetcher))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, username: str, fetcher):
+        """Re-fetches a stale entry; failures keep serving the stale copy"""
+        try:
+            self.put(username, await fetcher(username))
+        except Exception as e:
+            logger.warning(f"Background stats refresh failed for {username}: {e}")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size of the cache"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshing': len(self._refreshing),
+        }
@@ -0,0 +1,298 @@
+from collections import deque
+from os import getenv
+import abc
+import asyncio
+import logging
+import time
+import aiohttp
+import metrics
+from circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger('LeetGo')
+
+STATS_API_URL = 'https://leetcodestats.cyclic.app'
+LEETCODE_GRAPHQL_URL = 'https://leetcode.com/graphql'
+
+
+class StatsError(Exception):
+    """Raised when LeetCode statistics could not be fetched"""
+
+
+class StatsTimeoutError(StatsError):
+    """Raised when the stats API did not answer in time"""
+
+
+class StatsUnavailableError(StatsError):
+    """Raised without calling the stats API while its circuit breaker is open"""
+
+
+class StatsProvider(abc.ABC):
+    """Base class of the non-blocking sources of LeetCode statistics
+
+    Providers return stats dicts shaped like the REST stats API response, with
+    ``status`` set to ``'error'`` for unknown users, so callers never depend on
+    where the numbers came from. Subclasses implement ``fetch`` and may override
+    ``fetch_many`` when their upstream can answer for several users at once, in
+    which case ``batch_size`` tells callers how many to ask for per call.
+
+    A single keep-alive session is shared by every request so that concurrent
+    /stats calls reuse pooled connections instead of opening one per call.
+
+    Requests go through a circuit breaker, so while the API is down callers fail
+    fast instead of each waiting for a timeout. The per-request timeout adapts to
+    the latency the API has recently shown: a multiple of the p95 of the last
+    successful requests, clamped between ``min_timeout`` and ``total_timeout``.
+    """
+
+    # Users answered by one upstream request
+    batch_size = 1
+
+    # Successful request durations kept to derive the adaptive timeout
+    LATENCY_WINDOW = 200
+    # Fewer samples than this and the full timeout is used
+    MIN_LATENCY_SAMPLES = 20
+
+    def __init__(self, base_url: str = None, pool_size: int = None, per_host_limit: int = None,
+                 total_timeout: float = None, connect_timeout: float = None, min_timeout: float = None,
+                 timeout_multiplier: float = None, breaker: CircuitBreaker = None):
+        """Reads tuning knobs from the environment unless they are given explicitly
+
+        Args:
+            base_url: Root URL of the upstream API
+            pool_size: Maximum number of open connections in the pool
+            per_host_limit: Maximum number of concurrent connections to one host
+            total_timeout: Upper bound in seconds for a whole request
+            connect_timeout: Seconds allowed to establish a connection
+            min_timeout: Lower bound in seconds of the adaptive request timeout
+            timeout_multiplier: Factor applied to the observed p95 latency
+            breaker: Circuit breaker guarding the API
+        """
+        self.base_url = (base_url or getenv('STATS_API_URL', STATS_API_URL)).rstrip('/')
+        self.pool_size = pool_size or int(getenv('STATS_POOL_SIZE', '20'))
+        self.per_host_limit = per_host_limit or int(getenv('STATS_PER_HOST_LIMIT', '10'))
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout or float(getenv('STATS_TIMEOUT', '10')),
+            connect=connect_timeout or float(getenv('STATS_CONNECT_TIMEOUT', '3')),
+        )
+        self.min_timeout = min_timeout or float(getenv('STATS_MIN_TIMEOUT', '2'))
+        self.timeout_multiplier = timeout_multiplier or float(getenv('STATS_TIMEOUT_MULTIPLIER', '3'))
+        self.breaker = breaker or CircuitBreaker(
+            'stats',
+            failure_threshold=int(getenv('STATS_BREAKER_FAILURES', '5')),
+            reset_timeout=float(getenv('STATS_BREAKER_RESET', '30')),
+            max_reset_timeout=float(getenv('STATS_BREAKER_MAX_RESET', '300')),
+        )
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._session = None
+        metrics.STATS_TIMEOUT.set(self.timeout.total)
+
+    def current_timeout(self) -> float:
+        """Returns the request timeout in seconds derived from recent latencies"""
+        if len(self._latencies) < self.MIN_LATENCY_SAMPLES:
+            return self.timeout.total
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(self.timeout.total, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily creates the shared session inside the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                             limit_per_host=self.per_host_limit,
+                                             keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def _request(self, method: str, url: str, subject: str, **kwargs):
+        """Sends one request through the circuit breaker and returns the decoded JSON body
+
+        Raises:
+            StatsUnavailableError: The circuit breaker is open, no request was made
+            StatsTimeoutError: The request exceeded the adaptive timeout
+            StatsError: Any other network or HTTP failure
+        """
+        if not self.breaker.allow():
+            raise StatsUnavailableError(f"Stats API unavailable, next attempt in {self.breaker.retry_after:.0f}s")
+        total = self.current_timeout()
+        metrics.STATS_TIMEOUT.set(total)
+        timeout = aiohttp.ClientTimeout(total=total, connect=min(self.timeout.connect, total))
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            async with self._get_session().request(method, url, timeout=timeout, **kwargs) as response:
+                response.raise_for_status()
+                results = await response.json(content_type=None)
+                outcome = 'ok'
+                self._latencies.append(time.perf_counter() - started)
+                self.breaker.record_success()
+                return results
+        except asyncio.TimeoutError as e:
+            outcome = 'timeout'
+            self.breaker.record_failure()
+            raise StatsTimeoutError(f"Timed out fetching stats for {subject}") from e
+        except aiohttp.ClientResponseError as e:
+            # Rejections of the request itself mean the API is up; only server errors and throttling count
+            if e.status >= 500 or e.status == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise StatsError(f"Error fetching stats for {subject}: {e}") from e
+        except (aiohttp.ClientError, ValueError) as e:
+            self.breaker.record_failure()
+            raise StatsError(f"Error fetching stats for {subject}: {e}") from e
+        finally:
+            metrics.STATS_LATENCY.observe(time.perf_counter() - started, outcome)
+
+    @abc.abstractmethod
+    async def fetch(self, username: str) -> dict:
+        """Fetches the stats of one LeetCode user
+
+        Raises:
+            StatsError: The stats could not be fetched, see ``_request``
+        """
+
+    async def fetch_many(self, usernames: list) -> dict:
+        """Fetches the stats of several LeetCode users, keyed by username
+
+        Users whose stats could not be fetched are left out. This default makes
+        one ``fetch`` per user; callers bound the concurrency by asking for at
+        most ``batch_size`` users at a time.
+
+        Raises:
+            StatsUnavailableError: The circuit breaker is open
+        """
+        results = await asyncio.gather(*(self.fetch(username) for username in usernames), return_exceptions=True)
+        stats = {}
+        for username, result in zip(usernames, results):
+            if isinstance(result, StatsUnavailableError):
+                raise result
+            if isinstance(result, Exception):
+                logger.warning(f"Could not fetch stats for {username}: {result}")
+                continue
+            stats[username] = result
+        return stats
+
+    async def close(self):
+        """Closes the shared session and its pooled connections"""
+        try:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+                logger.info("Stats client session closed")
+        except Exception as e:
+            logger.error(f"Error closing stats client session: {e}")
+
+
+class RestStatsProvider(StatsProvider):
+    """Fetches stats from the public REST stats API, one request per user"""
+
+    async def fetch(self, username: str) -> dict:
+        return await self._request('GET', f'{self.base_url}/{username}', username)
+
+
+class GraphQLStatsProvider(StatsProvider):
+    """Fetches stats from LeetCode's GraphQL endpoint, many users per request
+
+    Each user is queried under its own alias (``u0``, ``u1``, ...) with the
+    username passed as a variable, so one POST answers for a whole batch.
+    LeetCode answers unknown users with a null alias, which becomes the same
+    ``status: error`` dict the REST API returns.
+    """
+
+    USER_FIELDS = ('profile { ranking reputation } contributions { points } '
+                   'submitStats { acSubmissionNum { difficulty count } }')
+
+    def __init__(self, base_url: str = None, session_cookie: str = None, batch_size: int = None, **kwargs):
+        """Same tuning knobs as StatsProvider, plus the GraphQL specific ones
+
+        Args:
+            base_url: GraphQL endpoint URL
+            session_cookie: Optional LEETCODE_SESSION cookie sent with every request
+            batch_size: Maximum number of users aliased in one query
+        """
+        super().__init__(base_url=base_url or getenv('LEETCODE_GRAPHQL_URL', LEETCODE_GRAPHQL_URL), **kwargs)
+        self.session_cookie = session_cookie if session_cookie is not None else getenv('LEETCODE_SESSION', '')
+        self.batch_size = batch_size or int(getenv('STATS_GRAPHQL_BATCH_SIZE', '50'))
+
+    def build_query(self, count: int) -> str:
+        """Returns a query asking for the question totals and ``count`` aliased users"""
+        variables = ', '.join(f'$u{index}: String!' for index in range(count))
+        users = ' '.join(f'u{index}: matchedUser(username: $u{index}) {{ {self.USER_FIELDS} }}' for index in range(count))
+        return f'query userStats({variables}) {{ allQuestionsCount {{ difficulty count }} {users} }}'
+
+    @staticmethod
+    def to_stats(user: dict, totals: dict) -> dict:
+        """Converts one aliased matchedUser result into the REST stats API shape"""
+        if not user:
+            return {'status': 'error', 'message': 'user does not exist'}
+        solved = {entry['difficulty']: entry['count'] for entry in user['submitStats']['acSubmissionNum']}
+        profile = user.get('profile') or {}
+        return {
+            'status': 'success',
+            'message': 'retrieved',
+            'totalSolved': solved.get('All', 0),
+            'totalQuestions': totals.get('All', 0),
+            'easySolved': solved.get('Easy', 0),
+            'totalEasy': totals.get('Easy', 0),
+            'mediumSolved': solved.get('Medium', 0),
+            'totalMedium': totals.get('Medium', 0),
+            'hardSolved': solved.get('Hard', 0),
+            'totalHard': totals.get('Hard', 0),
+            'ranking': profile.get('ranking'),
+            'contributionPoints': (user.get('contributions') or {}).get('points', 0),
+            'reputation': profile.get('reputation', 0),
+        }
+
+    async def _fetch_batch(self, usernames: list) -> dict:
+        headers = {'Referer': 'https://leetcode.com'}
+        if self.session_cookie:
+            headers['Cookie'] = f'LEETCODE_SESSION={self.session_cookie}'
+        payload = {
+            'query': self.build_query(len(usernames)),
+            'variables': {f'u{index}': username for index, username in enumerate(usernames)},
+        }
+        subject = usernames[0] if len(usernames) == 1 else f'{len(usernames)} users'
+        response = await self._request('POST', self.base_url, subject, json=payload, headers=headers)
+        data = response.get('data') if isinstance(response, dict) else None
+        if not data:
+            raise StatsError(f"Error fetching stats for {subject}: {response}")
+        totals = {entry['difficulty']: entry['count'] for entry in data.get('allQuestionsCount') or []}
+        try:
+            return {username: self.to_stats(data.get(f'u{index}'), totals) for index, username in enumerate(usernames)}
+        except (KeyError, TypeError) as e:
+            raise StatsError(f"Unexpected stats response for {subject}: {e}") from e
+
+    async def fetch(self, username: str) -> dict:
+        return (await self._fetch_batch([username]))[username]
+
+    async def fetch_many(self, usernames: list) -> dict:
+        """Fetches the stats of several users with one request per ``batch_size`` of them
+
+        The users of a failed batch are left out.
+
+        Raises:
+            StatsUnavailableError: The circuit breaker is open
+        """
+        stats = {}
+        for start in range(0, len(usernames), self.batch_size):
+            batch = usernames[start:start + self.batch_size]
+            try:
+                stats.update(await self._fetch_batch(batch))
+            except StatsUnavailableError:
+                raise
+            except StatsError as e:
+                logger.warning(f"Could not fetch a batch of {len(batch)} users: {e}")
+        return stats
+
+
+PROVIDERS = {
+    'rest': RestStatsProvider,
+    'graphql': GraphQLStatsProvider,
+}
+
+
+def create_stats_provider(name: str = None) -> StatsProvider:
+    """Builds the provider selected by ``name`` or the STATS_PROVIDER environment variable"""
+    name = (name or getenv('STATS_PROVIDER', 'rest')).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown STATS_PROVIDER {name!r}, expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
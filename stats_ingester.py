@@ -0,0 +1,120 @@
+from os import getenv
+import asyncio
+import logging
+import random
+import time
+import logging_setup
+from stats_client import StatsUnavailableError
+
+logger = logging.getLogger('LeetGo')
+
+
+def snapshot_from_stats(user_id: int, results: dict, taken_at: int) -> tuple:
+    """Converts a stats API response into a stats_snapshots row"""
+    ranking = results.get('ranking')
+    return (
+        user_id,
+        taken_at,
+        int(results.get('easySolved') or 0),
+        int(results.get('mediumSolved') or 0),
+        int(results.get('hardSolved') or 0),
+        ranking if isinstance(ranking, int) else None,
+    )
+
+
+class StatsIngester:
+    """Background job that periodically snapshots every registered user's stats
+
+    Users are walked page by page, so memory stays constant however many are
+    registered. Each page is split into batches of ``batch_size`` users, which
+    the provider may answer with a single request, and the batches are fetched
+    with bounded concurrency and a little random jitter so the upstream API sees
+    a steady trickle rather than a burst. The successful results of a page are
+    appended in one transaction.
+    """
+
+    def __init__(self, db, fetch_many, batch_size: int = 1, interval: float = None, concurrency: int = None,
+                 jitter: float = None, page_size: int = 200, after_pass=None):
+        """Reads the schedule from the environment unless it is given explicitly
+
+        Args:
+            db: AsyncDatabase to read users from and write snapshots to
+            fetch_many: Coroutine function returning the stats dicts of a list of LeetCode usernames,
+                keyed by username and leaving out the users it could not fetch
+            batch_size: Number of usernames passed to one ``fetch_many`` call
+            interval: Seconds between two ingestion passes
+            concurrency: Maximum number of batches in flight
+            jitter: Maximum random delay in seconds before each batch
+            page_size: Number of users read from the database at a time
+            after_pass: Optional coroutine function awaited after every completed pass
+        """
+        self.db = db
+        self.fetch_many = fetch_many
+        self.batch_size = max(1, batch_size)
+        self.interval = interval if interval is not None else float(getenv('STATS_INGEST_INTERVAL', '21600'))
+        self.concurrency = concurrency or int(getenv('STATS_INGEST_CONCURRENCY', '4'))
+        self.jitter = jitter if jitter is not None else float(getenv('STATS_INGEST_JITTER', '2'))
+        self.page_size = page_size
+        self.after_pass = after_pass
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def run(self):
+        """Ingests forever, sleeping ``interval`` seconds between passes"""
+        while True:
+            try:
+                await self.ingest_once()
+                if self.after_pass is not None:
+                    await self.after_pass()
+            except Exception as e:
+                logger.error(f"Error during stats ingestion: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def ingest_once(self) -> int:
+        """Snapshots every registered user once and returns the number of rows written"""
+        logging_setup.bind(correlation_id=f"ingest-{int(time.time())}")
+        started = time.monotonic()
+        after_discord_id = 0
+        written = 0
+        while True:
+            page = await self.db.get_lc_usernames_page(after_discord_id, self.page_size)
+            if not page:
+                break
+            after_discord_id = page[-1][0]
+            batches = [page[start:start + self.batch_size] for start in range(0, len(page), self.batch_size)]
+            results = await asyncio.gather(*(self._snapshot_batch(batch) for batch in batches),
+                                           return_exceptions=True)
+            unavailable = any(isinstance(result, StatsUnavailableError) for result in results)
+            snapshots = [row for result in results if isinstance(result, list) for row in result]
+            if snapshots:
+                await self.db.add_stats_snapshots(snapshots)
+                written += len(snapshots)
+            if unavailable:
+                # The stats API is down; skip the rest of the pass rather than fail every user
+                logger.warning(f"Stats API unavailable, ending ingestion pass after user {after_discord_id}")
+                break
+        logger.info(f"Stats ingestion wrote {written} snapshots in {time.monotonic() - started:.1f}s")
+        return written
+
+    async def _snapshot_batch(self, users: list) -> list:
+        """Fetches the stats of (discord_id, lc_username) pairs, returning snapshot rows for those that succeeded
+
+        Raises:
+            StatsUnavailableError: The stats API circuit is open, so the pass should stop
+        """
+        # Jitter before taking a slot, so the delay spreads requests out instead of idling a slot
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with self._semaphore:
+            try:
+                stats = await self.fetch_many([lc_username for _, lc_username in users])
+            except StatsUnavailableError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not snapshot stats for {len(users)} users: {e}")
+                return []
+        taken_at = int(time.time())
+        rows = []
+        for user_id, lc_username in users:
+            results = stats.get(lc_username)
+            if isinstance(results, dict) and results.get('status') != 'error':
+                rows.append(snapshot_from_stats(user_id, results, taken_at))
+        return rows
@@ -0,0 +1,51 @@
+import unittest
+
+from benchmarks.stats_server import StatsServer, synthetic_stats
+from stats_client import GraphQLStatsProvider
+
+
+class GraphQLStatsProviderTest(unittest.IsolatedAsyncioTestCase):
+    """Runs GraphQLStatsProvider against the local stand-in for the stats API"""
+
+    async def asyncSetUp(self):
+        self.server = StatsServer(latency=0)
+        url = await self.server.start()
+        self.provider = GraphQLStatsProvider(base_url=f'{url}/graphql', session_cookie='', batch_size=3)
+
+    async def asyncTearDown(self):
+        await self.provider.close()
+        await self.server.stop()
+
+    def test_build_query_aliases_each_user(self):
+        query = self.provider.build_query(3)
+        self.assertIn('$u0: String!, $u1: String!, $u2: String!', query)
+        for index in range(3):
+            self.assertIn(f'u{index}: matchedUser(username: $u{index})', query)
+        self.assertNotIn('u3:', query)
+
+    async def test_fetch_matches_rest_shape(self):
+        stats = await self.provider.fetch('lc_user1')
+        expected = synthetic_stats('lc_user1')
+        del expected['acceptanceRate']
+        self.assertEqual(stats, expected)
+
+    async def test_fetch_many_maps_aliases_back_to_users(self):
+        usernames = ['lc_user1', 'ghost', 'lc_user2', 'lc_user3', 'nobody']
+        stats = await self.provider.fetch_many(usernames)
+
+        # Five users in batches of three take two requests
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(set(stats), set(usernames))
+        for username in ('lc_user1', 'lc_user2', 'lc_user3'):
+            self.assertEqual(stats[username]['status'], 'success')
+            self.assertEqual(stats[username]['totalSolved'], synthetic_stats(username)['totalSolved'])
+        for username in ('ghost', 'nobody'):
+            self.assertEqual(stats[username], {'status': 'error', 'message': 'user does not exist'})
+
+    async def test_fetch_unknown_user(self):
+        stats = await self.provider.fetch('ghost')
+        self.assertEqual(stats, {'status': 'error', 'message': 'user does not exist'})
+
+
+if __name__ == '__main__':
+    unittest.main()